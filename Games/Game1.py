@@ -10,7 +10,9 @@ import numpy as np
 
 from Model.ControlBox import ControlsHandler
 from Model.Camera import CameraHandler, ImageProcessing
+from Model.Controller import PositionController
 from Model.Instructions import InstructionsPane
+from Model.Scheduler import GetScheduler, FormatStageStats
 
 def resource_path(file_path):
     if hasattr(sys, "_MEIPASS"):
@@ -40,22 +42,28 @@ class Game1(QMainWindow):
     def InitializeClasses(self):
         self.Camera = CameraHandler(self)
         self.Controls = ControlsHandler(self)
+        self.Controller = PositionController(self.Camera.Positions, self.Controls.Edumag)
+        self.Controller.start()
 
     def InitializeUi(self):
         self.StartButton = self.findChild(QCheckBox, 'StartButton')
+        self.AutoButton = self.findChild(QCheckBox, 'AutoButton')
         self.ScoreSpinbox = self.findChild(QSpinBox, 'ScoreSpinbox')
         self.GameTimer = self.findChild(QSpinBox, 'GameTimer')
 
     def ConnectSignals(self):
         self.StartButton.toggled.connect(self.StartGame)
         self.InstructionsButton.pressed.connect(self.ShowInstructions)
+        self.AutoButton.toggled.connect(self.UpdateAutoTarget)
 
     def SetupTimer(self, fps: int = 10):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.GameLogic)
+        self.Scheduler = GetScheduler()
+        self.Scheduler.stats_updated.connect(self.ShowControllerStats)
+        self.GameStage = None
+        self.fps = fps
 
 
-    def StartGame(self, fps=10):
+    def StartGame(self):
         if self.StartButton.isChecked():
             if not self.Camera.CameraCheckbox.isChecked():
                 self.Camera.CameraCheckbox.setChecked(True)
@@ -64,18 +72,21 @@ class Game1(QMainWindow):
             self.start_time = time.time()
             self.ScoreSpinbox.setValue(0)
             self.target = np.array([[350, 350]])
-            self.timer.start(1000 // fps)
+            self.Scheduler.RemoveStage(self.GameStage)
+            self.GameStage = self.Scheduler.AddStage('whack a mole', self.GameLogic, self.fps, gui=True)
+            self.UpdateAutoTarget()
 
 
         else:
             self.StopGame()
 
     def StopGame(self):
-        try: self.timer.stop()
-        except: pass
+        self.Scheduler.RemoveStage(self.GameStage)
+        self.GameStage = None
 
         self.Camera.drawn_points = None
         self.GameTimer.setValue(60)
+        self.Controller.SetTarget(None)
 
     def GameLogic(self):
         elapsed_time = time.time() - self.start_time
@@ -90,11 +101,23 @@ class Game1(QMainWindow):
                     self.target = self.RNG()
                     self.Camera.drawn_points = np.hstack((self.target, self.color))
                     self.ScoreSpinbox.setValue(self.ScoreSpinbox.value() + 1)
+                    self.UpdateAutoTarget()
 
         else:
             self.StartButton.setChecked(False)
             self.Camera.point = False
 
+    def UpdateAutoTarget(self):
+        # Auto drives the robot to the current target with the closed-loop controller
+        if self.AutoButton.isChecked() and self.StartButton.isChecked():
+            self.Controller.SetTarget(self.target)
+        else:
+            self.Controller.SetTarget(None)
+
+    def ShowControllerStats(self, stats: dict):
+        if self.Controller.name in stats:
+            self.AutoButton.setToolTip('control loop ' + FormatStageStats(stats[self.Controller.name]))
+
     def RNG(self, max_distance=80):
         phi = np.random.uniform(0, 2 * np.pi)
         r = np.random.uniform(0, max_distance)
@@ -111,7 +134,8 @@ class Game1(QMainWindow):
 
     def closeEvent(self, event):
         super().closeEvent(event)
+        self.Controller.stop()
         self.Camera.closeEvent(event)
         self.Controls.closeEvent()
-        self.timer.stop()
+        self.StopGame()
         self.closed.emit()
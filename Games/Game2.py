@@ -11,6 +11,7 @@ from Model.Camera import CameraHandler
 from Model.EduMag import EduMagHandler
 from Model.Instructions import InstructionsPane
 from Model.Keyboard import ArrowKeyAngle
+from Model.Trajectory import TrajectoryPlayer
 
 
 def resource_path(file_path):
@@ -36,6 +37,8 @@ class Game2(QMainWindow):
         self.Edumag.DisplayField = True
         self.Camera = CameraHandler(self)
         self.Keyboard = ArrowKeyAngle()
+        self.Player = TrajectoryPlayer(self.Edumag)
+        self.row_currents = np.zeros((0, 4))
 
     def InitializeUi(self):
         self.AddButton = self.findChild(QPushButton, "AddButton")
@@ -61,6 +64,8 @@ class Game2(QMainWindow):
         self.RemoveAllButton.pressed.connect(self.RemoveParams)  # Remove All Params (notice the s at the end)
 
         self.ExecuteButton.pressed.connect(self.ExecuteCommands)
+        self.PauseCheckBox.toggled.connect(self.SetPaused)
+        self.Player.row_changed.connect(self.ShowStep)
         self.InstructionsButton.pressed.connect(self.ShowInstructions)
 
         self.CommandsBox.selectionModel().selectionChanged.connect(self.ShowSelectedVecField)
@@ -113,26 +118,26 @@ class Game2(QMainWindow):
                 if item is not None and item.text() != "":
                     data[row, col] = float(item.text())
 
-        self.iter = iter(data)
-        self.ProcessNext()
-
-    def ProcessNext(self):
+        # The whole waveform is solved up front and streamed by the scheduler,
+        # rows blend into each other as fast as the coils can follow
+        self.row_currents = self.Edumag.GetCurrentsBatch(data[:, 0], data[:, 1], data[:, 2])
+        self.Player.Load(data[:, :4])
         if not self.PauseCheckBox.isChecked():
-            try:
-                row = next(self.iter)
-                param = row[:3]
-                delay = int(row[-1])
-
-                self.Edumag.UpdateCurrents(param[0], param[1], param[2])
+            self.Player.Start()
 
-                QTimer.singleShot(delay * 1000, self.ProcessNext)
+    def ShowStep(self, step: int):
+        I = self.row_currents[step]
+        self.Edumag.last_current = I
+        self.Edumag.UpdateLabels(I)
+        if self.Edumag.DisplayField and self.Edumag.VecViewCheckbox is not None and self.Edumag.VecViewCheckbox.isChecked():
+            self.Edumag.UpdateField(I)
 
-            except StopIteration:
-                self.Edumag.ResetCurrents()
-                pass
-            
+    def SetPaused(self, paused: bool):
+        # Pausing turns the coils off, resuming continues from the same sample
+        if paused:
+            self.Player.Pause()
         else:
-            self.Edumag.ResetCurrents()
+            self.Player.Resume()
 
     def ShowSelectedVecField(self):
         SelectedItem = self.CommandsBox.selectedItems()
@@ -178,6 +183,8 @@ class Game2(QMainWindow):
 
     def closeEvent(self, event):
         super().closeEvent(event)
+        self.Player.Stop()
+        self.Edumag.closeEvent()
         self.Camera.closeEvent(event)
         self.closed.emit()
 
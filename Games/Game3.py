@@ -10,6 +10,8 @@ from Model.Camera import CameraHandler
 from Model.ControlBox import ControlsHandler
 from Model.ColorWheelLogic import PaintWheel
 from Model.Instructions import InstructionsPane
+from Model.Scheduler import GetScheduler
+from Model.StrokeBuffer import StrokeBuffer, StrokeSimplifier
 
 import numpy as np
 from datetime import datetime
@@ -39,7 +41,9 @@ class Game3(QMainWindow):
         self.SetupTimer()
 
         self.color = np.array([[255, 0, 0]])  # default red
-        self.AllPoints = np.array([])
+        self.Strokes = StrokeBuffer()
+        self.Simplifier = StrokeSimplifier()
+        self.pen_frame = None  # last camera frame fed to the pen stroke, None while the pen is up
 
     def InitializeClasses(self):
         self.Controls = ControlsHandler(self)
@@ -50,27 +54,32 @@ class Game3(QMainWindow):
         self.JoystickCheckbox = self.findChild(QCheckBox, "JoystickCheckbox")
         self.SaveImageButton = self.findChild(QPushButton, "SaveImage")
         self.InstructionsButton = self.findChild(QPushButton, "InstructionsButton")
+        self.PenDownCheckbox = self.findChild(QCheckBox, "PenDownCheckbox")
 
     def ConnectSignals(self):
         self.ColorWheelWidget.colorChanged.connect(self.ChangeSelectedColor)
         self.SaveImageButton.pressed.connect(self.SaveFrame)
         self.InstructionsButton.pressed.connect(self.ShowInstructions)
+        self.Controls.Joystick.state_changed.connect(self.UpdateWheelFromJoystick)
+        self.Controls.Joystick.button_pressed.connect(self.GetJoystickButtons)
 
-    def SetupTimer(self):
-        self.timer = QTimer()
-        self.timer.start(1000 // 33)
-        self.timer.timeout.connect(self.UpdateWheelFromJoystick)
-        self.timer.timeout.connect(self.GetJoystickButtons)
+    def SetupTimer(self, fps: int = 33):
+        # Buttons and sticks arrive as joystick signals, this only feeds the pen stroke
+        self.Scheduler = GetScheduler()
+        self.InputStage = self.Scheduler.AddStage('paint input', self.PollPen, fps, gui=True)
 
-    def UpdateWheelFromJoystick(self):
+    def PollPen(self):
+        if self.PenDownCheckbox.isChecked():
+            self.UpdatePen(self.Controls.IsJoyButtonHeld('a'))
+
+    def UpdateWheelFromJoystick(self, state: dict):
         if self.JoystickCheckbox.isChecked():
-            angle = self.Controls.GetRightStickValue()
+            angle = state['right']
             if angle is not None:
                 self.ColorWheelWidget.UpdateFromJoystickAngle(angle)
 
-    def GetJoystickButtons(self):
-        Joy_Input = self.Controls.GetJoyButtons()
-        if Joy_Input == 'a':
+    def GetJoystickButtons(self, Joy_Input: str):
+        if Joy_Input == 'a' and not self.PenDownCheckbox.isChecked():
             self.HandleDraw()
             #time.sleep(0.1)
         if Joy_Input == 'start':
@@ -79,18 +88,61 @@ class Game3(QMainWindow):
     def HandleDraw(self):
         pos = self.Camera.SendRobotPos()
         if pos is not None:
-            current_point_mat = np.hstack((pos.reshape(1, -1), self.color))
-            if self.AllPoints.shape[0] >= 1:
-                self.AllPoints = np.vstack((self.AllPoints, current_point_mat))
+            self.Strokes.Append(pos, self.color)
+            if len(self.Strokes) > 1:
                 self.Camera.line = True
-                self.Camera.drawn_line = self.AllPoints
+                self.Camera.drawn_line = self.Strokes.View()
             else:
-                self.AllPoints = current_point_mat
                 self.Camera.point = True
-                self.Camera.drawn_points = self.AllPoints
+                self.Camera.drawn_points = self.Strokes.View().copy()
+
+    def UpdatePen(self, held: bool):
+        """
+        While the pen is down every tracked camera frame since the last poll goes into the
+        current stroke, simplified on the way in so the overlay only gets the vertices
+        :param held: pen button state
+        """
+        if not held:
+            self.pen_frame = None
+            return
+
+        changed = False
+        if self.pen_frame is None:
+            latest = self.Camera.Positions.Latest(max_age=0.5)
+            if latest is None:
+                return
+            self.Strokes.BeginStroke()
+            self.Strokes.Append(latest[1:3], self.color)
+            self.Strokes.Append(latest[1:3], self.color)  # moving end of the stroke
+            self.Simplifier.Begin(latest[1:3])
+            self.pen_frame = latest[3]
+            changed = True
+
+        rows = self.Camera.Positions.Recent(32)
+        for row in rows[rows[:, 3] > self.pen_frame]:
+            self.pen_frame = row[3]
+            vertex = self.Simplifier.Add(row[1:3])
+            if vertex is None:
+                continue
+            if isinstance(vertex, str):
+                self.Strokes.ReplaceLast(row[1:3])
+            else:
+                self.Strokes.ReplaceLast(vertex)
+                self.Strokes.Append(row[1:3], self.color)
+            changed = True
+
+        # Reassigning drawn_line re-renders the overlay, skip it while the pen is still
+        if not changed:
+            return
+        self.Camera.line = True
+        self.Camera.drawn_line = self.Strokes.View()
+        self.PenDownCheckbox.setToolTip(f'Last stroke: {self.Simplifier.samples} samples drawn with '
+                                        f'{self.Simplifier.vertices} vertices')
 
     def ClearAllElements(self):
-        self.AllPoints = np.array([])
+        self.Strokes.Clear()
+        self.pen_frame = None
+        self.PenDownCheckbox.setToolTip('')
         
         self.Camera.drawn_points = None
         self.Camera.point = False
@@ -130,6 +182,7 @@ class Game3(QMainWindow):
 
     def closeEvent(self, event):
         super().closeEvent(event)
+        self.Scheduler.RemoveStage(self.InputStage)
         self.Camera.closeEvent(event)
         self.Controls.closeEvent()
         self.closed.emit()
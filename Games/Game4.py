@@ -5,8 +5,11 @@ from PyQt5 import uic
 
 from Model.Camera import CameraHandler
 from Model.ControlBox import ControlsHandler
+from Model.Controller import PositionController
 from Model.Instructions import InstructionsPane
-from Model.MST import MST
+from Model.RouteScorer import RouteScorer
+from Model.SpatialIndex import SpatialIndex
+from Model.StrokeBuffer import StrokeBuffer
 
 import numpy as np
 
@@ -36,13 +39,15 @@ class Game4(QMainWindow):
         self.InitializeUi()
         self.InitializeClasses()
         self.ConnectSignals()
-        self.SetupTimer()
 
         self.nodes = np.array([])
-        self.ConnectedNodes = np.array([])
+        self.NodeIndex = SpatialIndex(50)
+        self.ConnectedNodes = StrokeBuffer(separate=False)  # one stroke per edge, drawn as pairs
         self.ROI = (300, 450)
         self.SelectedNode = None
+        self.SelectedIndex = None
         self.Camera.increment = 2
+        self.Waypoints = []
 
     def InitializeUi(self):
         self.StartButton = self.findChild(QCheckBox, "StartButton")
@@ -53,10 +58,15 @@ class Game4(QMainWindow):
         self.GiveUpButton = self.findChild(QPushButton, "ShowSolutionButton")
         self.SavePNGButton = self.findChild(QPushButton, "SaveImageButton")
         self.InstructionsButton = self.findChild(QPushButton, "InstructionsButton")
+        self.AutoButton = self.findChild(QCheckBox, "AutoButton")
+        self.RouteStatusLabel = self.findChild(QLabel, "RouteStatusLabel")
 
     def InitializeClasses(self):
         self.Camera = CameraHandler(self)
         self.Controls = ControlsHandler(self)
+        self.Controller = PositionController(self.Camera.Positions, self.Controls.Edumag)
+        self.Controller.start()
+        self.Scorer = RouteScorer()
 
     def ConnectSignals(self):
         self.StartButton.toggled.connect(self.StartGame)
@@ -64,32 +74,36 @@ class Game4(QMainWindow):
         self.GiveUpButton.pressed.connect(self.UserGiveUp)
         self.SavePNGButton.pressed.connect(self.SaveImage)
         self.InstructionsButton.pressed.connect(self.ShowInstructions)
-
-    def SetupTimer(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.JoystickControls)
-        
+        self.AutoButton.toggled.connect(self.AutoRoute)
+        self.Controller.target_reached.connect(self.NextWaypoint)
+        self.Controls.Joystick.button_pressed.connect(self.JoystickControls)
 
     def StartGame(self):
         if self.StartButton.isChecked():
             self.DifficultyBox.setEnabled(False)
             self.CameraCheckbox.setChecked(True)
             self.GenerateNodes()
+            self.Scorer.SetNodes(self.nodes)
             self.DisplayNodes()
             self.ScoreSpinbox.setValue(0)
-            self.timer.start(100)
+            self.ShowRouteStatus()
         else:
             self.EndGame()
             self.DifficultyBox.setEnabled(True)
 
     def EndGame(self):
-        self.timer.stop()
+        self.Waypoints = []
+        self.Controller.SetTarget(None)
         self.Camera.point = False
         self.Camera.line = False
         self.Camera.outline = False
         self.nodes = np.array([])
-        self.ConnectedNodes = np.array([])
+        self.NodeIndex = SpatialIndex(50)
+        self.ConnectedNodes.Clear()
         self.SelectedNode = None
+        self.SelectedIndex = None
+        self.Scorer.SetNodes(self.nodes)
+        self.RouteStatusLabel.setText('')
         if self.GiveUpButton.text() == 'Hide Solution':
             self.GiveUpButton.setText('Show Solution')
 
@@ -104,7 +118,8 @@ class Game4(QMainWindow):
         max_distance = 100
         min_distance = 50
 
-        nodes = []
+        # Also used for hit-testing, the cell size covers both radii
+        index = SpatialIndex(min_distance)
         for _ in range(num_nodes):
             while True:
                 if np.random.rand() == 0.5:
@@ -120,11 +135,12 @@ class Game4(QMainWindow):
                 x = np.clip(x, 300, 450)
                 y = np.clip(y, 300, 450)
 
-                if len(nodes) == 0 or np.all(np.linalg.norm(np.array(nodes) - np.array([x, y]), axis=1) >= min_distance):
-                    nodes.append([x, y])
+                if not index.AnyWithin((x, y), min_distance):
+                    index.Insert((x, y))
                     break
 
-        self.nodes = np.array(nodes)
+        self.nodes = np.array(index.points)
+        self.NodeIndex = index
         
 
     def DisplayNodes(self):
@@ -137,8 +153,10 @@ class Game4(QMainWindow):
         nodes_with_color = np.hstack((self.nodes, temp))
         self.Camera.drawn_points = nodes_with_color
 
-    def JoystickControls(self):
-        joy_input = self.Controls.GetJoyButtons()
+    def JoystickControls(self, joy_input: str):
+        if not self.StartButton.isChecked():
+            return
+
         if joy_input == 'a':
             self.CheckForNode()
 
@@ -151,25 +169,65 @@ class Game4(QMainWindow):
     def CheckForNode(self):
         pos = self.Camera.SendRobotPos()
         if pos is not None:
-            close_node = None
-            for node in self.nodes:
-                if np.linalg.norm(pos - node) <= 20:
-                    close_node = np.array(node)
-            if close_node is not None:
+            close_index = self.NodeIndex.Nearest(pos, 20)
+            if close_index is not None:
+                close_node = np.array(self.nodes[close_index])
                 if self.SelectedNode is None:
                     self.SelectedNode = close_node
+                    self.SelectedIndex = close_index
                     self.HighlightSelectedNode()
                 else:
                     if np.any(self.SelectedNode != close_node):
-                        self.ConnectNodes(close_node)
+                        self.ConnectNodes(close_node, close_index)
                         self.SelectedNode = None
+                        self.SelectedIndex = None
                         self.RemoveHighlight()
 
+    def AutoRoute(self):
+        """
+        Drives the robot along the solution with the closed-loop controller, selecting
+        each edge's start node and connecting it to its end node like a player would
+        """
+        if not (self.AutoButton.isChecked() and self.StartButton.isChecked() and len(self.nodes) > 1):
+            self.Waypoints = []
+            self.Controller.SetTarget(None)
+            return
+
+        self.ResetConnections()
+        edges = [np.array(edge, dtype=float).reshape(2, 2) for edge in self.CalculateMST()]
+        pos = self.Camera.SendRobotPos()
+        last = pos if pos is not None else np.array([350, 350])
+
+        # Greedy order: next the edge with an endpoint closest to where the robot will be
+        self.Waypoints = []
+        while edges:
+            distances = [np.linalg.norm(edge - last, axis=1) for edge in edges]
+            i = int(np.argmin([d.min() for d in distances]))
+            edge = edges.pop(i)
+            if distances[i][1] < distances[i][0]:
+                edge = edge[::-1]
+            self.Waypoints.extend(edge)
+            last = edge[1]
+
+        self.Controller.SetTarget(self.Waypoints[0])
+
+    def NextWaypoint(self):
+        if self.Waypoints:
+            self.CheckForNode()
+            self.Waypoints.pop(0)
+            if self.Waypoints:
+                self.Controller.SetTarget(self.Waypoints[0])
+            else:
+                self.AutoButton.setChecked(False)
+
     def ResetConnections(self):
-        self.ConnectedNodes = np.array([])
+        self.ConnectedNodes.Clear()
         self.Camera.line = False
         self.Camera.outline = False
         self.SelectedNode = None
+        self.SelectedIndex = None
+        self.Scorer.Reset()
+        self.ShowRouteStatus()
         if self.GiveUpButton.text() == 'Hide Solution':
             self.GiveUpButton.setText('Show Solution')
 
@@ -184,76 +242,48 @@ class Game4(QMainWindow):
             self.Camera.outline = False
             self.Camera.outlined_points = None
 
-    def ConnectNodes(self, node, color=(0, 255, 0)):
-        color = np.array([color])
-        if self.ConnectedNodes.shape[0] > 1:
-            new_row = np.hstack((np.array([[node[0], node[1]]]), color))
-            prev_row = np.hstack((np.expand_dims(self.SelectedNode, axis=0), color))
-            self.ConnectedNodes = np.vstack((self.ConnectedNodes, prev_row, new_row))
-
-        else:
-            temp = np.hstack((np.array([[self.SelectedNode[0], self.SelectedNode[1]]]), color))
-
-            self.ConnectedNodes = np.vstack((temp, np.hstack((np.array([[node[0], node[1]]]), color))))
+    def ConnectNodes(self, node, index: int, color=(0, 255, 0)):
+        self.Scorer.Connect(self.SelectedIndex, index)
+        self.ConnectedNodes.BeginStroke()
+        self.ConnectedNodes.Append(self.SelectedNode, color)
+        self.ConnectedNodes.Append(node, color)
 
         self.DrawConnectedNodes()
+        self.ShowRouteStatus()
 
     def DrawConnectedNodes(self):
         self.Camera.line = True
-        self.Camera.drawn_line = self.ConnectedNodes
+        self.Camera.drawn_line = self.ConnectedNodes.View()
 
     def AnalyzeUserInput(self):
-        if hasattr(self, 'ConnectedNodes'):
-            if self.ConnectedNodes.size > 1:
-                user_input_points = self.ConnectedNodes[:, :2]
-                user_input_points = np.array(self.RemoveDuplicates(user_input_points))
-                arranged_points = np.array(self.CalculateMST())
-
-                formatted_points = []
-                for start_x, start_y, end_x, end_y in arranged_points:
-                    formatted_points.append([start_x, start_y])
-                    formatted_points.append([end_x, end_y])
-
-                formatted_points = np.array(formatted_points)
-
-                Lu = np.sqrt(np.sum(np.diff(user_input_points, axis=0) ** 2, axis=1))
-                Lu = np.sum(Lu)
-
-                Li = np.sqrt(np.sum(np.diff(formatted_points, axis=0) ** 2, axis=1))
-                Li = np.sum(Li)
-
-                Eu = user_input_points.shape[0] - 1
-                Ei = formatted_points.shape[0] - 1
-
-                difficulty = self.DifficultyBox.currentText()
-                k = 0.001
-                if difficulty == 'Medium':
-                    k = 0.005
-                elif difficulty == 'Hard':
-                    k = 0.009
-
-                print(f"Lu: {Lu}, Li: {Li}, Eu: {Eu}, Ei: {Ei}")
-                Score = max(0, (1 - (abs((Lu - Li)) / Li) - k * abs(Eu - Ei)))
-                print(f'{Score:.2f}')
-                self.ScoreSpinbox.setValue(int(Score*100))
-
-    def RemoveDuplicates(self, points):
-        unique_points = [points[0]]
-        for i in range(1, len(points)):
-            if not np.array_equal(points[i], points[i - 1]):
-                unique_points.append(points[i])
-
-        cleaned_points = []
-        seen = set()
-        for i in range(len(unique_points) - 1):
-            pair = (tuple(unique_points[i]), tuple(unique_points[i+1]))
-            if pair not in seen:
-                cleaned_points.append(unique_points[i])
-                seen.add(pair)
-
-        cleaned_points.append(points[-1])
-
-        return cleaned_points
+        if self.Scorer.edges > 0:
+            Score = self.Scorer.Score(self.EdgePenalty())
+            print(f"Lu: {self.Scorer.length}, Li: {self.Scorer.solution_length}, "
+                  f"Eu: {self.Scorer.edges}, Ei: {len(self.nodes) - 1}")
+            print(f'{Score:.2f}')
+            self.ScoreSpinbox.setValue(int(Score*100))
+
+    def EdgePenalty(self) -> float:
+        difficulty = self.DifficultyBox.currentText()
+        k = 0.001
+        if difficulty == 'Medium':
+            k = 0.005
+        elif difficulty == 'Hard':
+            k = 0.009
+        return k
+
+    def ShowRouteStatus(self):
+        # Every stat here is kept up to date by the scorer, reading them costs nothing
+        if not self.StartButton.isChecked():
+            return
+        remaining = self.Scorer.EdgesRemaining()
+        status = f'Live score {int(self.Scorer.Score(self.EdgePenalty()) * 100)}, ' \
+                 f'{remaining} edge{"" if remaining == 1 else "s"} remaining'
+        if self.Scorer.cycles:
+            status += f', {self.Scorer.cycles} loop{"" if self.Scorer.cycles == 1 else "s"}'
+        if self.Scorer.IsSolved():
+            status = 'Solved! ' + status
+        self.RouteStatusLabel.setText(status)
 
     def UserGiveUp(self):
         if self.StartButton.isChecked():
@@ -263,7 +293,7 @@ class Game4(QMainWindow):
             else:
                 self.GiveUpButton.setText('Show Solution')
                 if len(self.ConnectedNodes) > 0:
-                    self.Camera.drawn_line = self.ConnectedNodes
+                    self.Camera.drawn_line = self.ConnectedNodes.View()
                 else:
                     self.Camera.line = False
                     self.Camera.drawn_line = None
@@ -284,18 +314,20 @@ class Game4(QMainWindow):
         self.Camera.drawn_line = formatted_points
 
     def CalculateMST(self) -> list:
-        MST_instance = MST(self.nodes)
-
-        return MST_instance.CalculateMST()
+        # Solved once per level by the scorer
+        return self.Scorer.solution
 
     def UndoAction(self):
         if self.SelectedNode is not None:
             self.SelectedNode = None
+            self.SelectedIndex = None
             self.Camera.outline = False
 
-        elif self.ConnectedNodes.shape[0] >= 1:
-            self.ConnectedNodes = self.ConnectedNodes[:-2]
-            self.Camera.drawn_line = self.ConnectedNodes
+        elif len(self.ConnectedNodes) >= 1:
+            self.ConnectedNodes.UndoStroke()
+            self.Camera.drawn_line = self.ConnectedNodes.View()
+            self.Scorer.Undo()
+            self.ShowRouteStatus()
 
     def SaveImage(self, file_name='path_img', file2_name='full_img', folder='images'):
         if self.CameraCheckbox.isChecked():
@@ -321,6 +353,7 @@ class Game4(QMainWindow):
 
     def closeEvent(self, event):
         super().closeEvent(event)
+        self.Controller.stop()
         self.Camera.closeEvent(event)
         self.Controls.closeEvent()
         self.closed.emit()
@@ -5,31 +5,143 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5.QtWidgets import *
 
-from picamera2 import Picamera2
+try:
+    from picamera2 import Picamera2
+except ImportError:
+    Picamera2 = None
 
+import os
+import threading
 import time
 
+from Model.Tracker import DetectRobot, RobotTracker, PositionBuffer
+from Model.Recorder import GetRecorder, ReplayCamera
 
-class CameraThread(QThread):
-    frame_captured = pyqtSignal(np.ndarray)
+ROI_SIZE = 700  # side of the processed frame, the centre of the 1080x1080 field of view
 
-    def __init__(self, idx: int = 0):
-        super().__init__()
+
+class PicameraBackend:
+    def __init__(self, full_size: int = 1080, roi_size: int = ROI_SIZE):
         self.cam = Picamera2()
-        self.cam.configure(self.cam.create_video_configuration(main={"size": (1080, 1080), "format": "RGB888"}, controls={"ExposureTime": 10000}))
+        self.cam.configure(self.cam.create_video_configuration(main={"size": (roi_size, roi_size), "format": "RGB888"}, controls={"ExposureTime": 10000}))
         self.cam.start()
+
+        # Let the ISP crop to the ROI, same field of view as cutting the centre out of a 1080x1080 frame
+        x, y, w, h = self.cam.capture_metadata()["ScalerCrop"]
+        crop_w, crop_h = w * roi_size // full_size, h * roi_size // full_size
+        self.cam.set_controls({"ScalerCrop": (x + (w - crop_w) // 2, y + (h - crop_h) // 2, crop_w, crop_h)})
+
+    def Capture(self) -> np.ndarray:
+        return self.cam.capture_array()
+
+    def Close(self) -> None:
+        self.cam.close()
+
+
+def CreateCameraBackend():
+    """
+    Picks the frame source from EDUMAG_CAMERA ('picamera', 'sim' or 'replay:<session folder>').
+    Defaults to the Picamera2 when it is installed, the synthetic camera otherwise
+    :return: object with Capture() -> BGR ndarray and Close()
+    """
+    source = os.environ.get('EDUMAG_CAMERA', 'picamera' if Picamera2 is not None else 'sim')
+    if source.startswith('replay:'):
+        return ReplayCamera(source[len('replay:'):])
+    if source == 'sim':
+        from Model.Simulator import SyntheticCamera
+        return SyntheticCamera()
+    return PicameraBackend()
+
+
+class LatestFrame:
+    """
+    Single-slot frame buffer. A new frame replaces one that was never taken,
+    so a slow consumer skips stale frames instead of queueing them.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frame = None
+        self.frame_id = -1
+        self.dropped = 0
+
+    def Put(self, frame: np.ndarray, frame_id: int) -> bool:
+        """
+        :return: True if the slot was empty, i.e. the consumer needs a notification
+        """
+        with self.lock:
+            empty = self.frame is None
+            if not empty:
+                self.dropped += 1
+            self.frame = frame
+            self.frame_id = frame_id
+            return empty
+
+    def Take(self):
+        """
+        :return: (frame, frame_id), frame is None if nothing new arrived
+        """
+        with self.lock:
+            frame, self.frame = self.frame, None
+            return frame, self.frame_id
+
+
+class CameraThread(QThread):
+    frame_ready = pyqtSignal()  # a frame is waiting in LatestFrame
+    stats_updated = pyqtSignal(dict)  # captured/processed/dropped fps, about once a second
+    robot_pos = pyqtSignal(float, int, int, int)  # timestamp (time.monotonic), x, y, frame_id
+
+    def __init__(self, idx: int = 0, backend=None):
+        super().__init__()
+        self.cam = backend if backend is not None else CreateCameraBackend()
         self.running = False
         self.ImageProcessing = ImageProcessing()
+        self.LatestFrame = LatestFrame()
+        self.Tracker = RobotTracker()
+        self.Positions = PositionBuffer()
+        self.Recorder = GetRecorder()
+
+        self.captured = 0
+        self.processed = 0
+        self.stats_time = time.monotonic()
+        self.stats_counts = (0, 0, 0)
 
     def run(self):
         while self.running:
             if not self.running:
                 break
-            frame = self.cam.capture_array()
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            frame = self.cam.Capture()
+            if frame is None:
+                continue
+            timestamp = time.monotonic()
+            self.captured += 1
             frame = self.ImageProcessing.OutputProcessedCameraFrame(frame)
             if frame is not None:
-                self.frame_captured.emit(frame)
+                self.processed += 1
+                self.LocateRobot(frame, timestamp, self.captured)
+                self.Recorder.RecordFrame(frame, timestamp, self.captured)
+                if self.LatestFrame.Put(frame, self.captured):
+                    self.frame_ready.emit()
+            self.UpdateStats()
+
+    def LocateRobot(self, frame, timestamp, frame_id):
+        # Once per captured frame, so readers never touch the image
+        pos, confidence = self.Tracker.Track(frame, timestamp)
+        if pos is not None:
+            self.Positions.Append(timestamp, pos, frame_id, confidence)
+            self.Recorder.RecordPosition(timestamp, pos, frame_id, confidence)
+            self.robot_pos.emit(timestamp, int(pos[0]), int(pos[1]), frame_id)
+
+    def UpdateStats(self):
+        now = time.monotonic()
+        elapsed = now - self.stats_time
+        if elapsed >= 1.0:
+            counts = (self.captured, self.processed, self.LatestFrame.dropped)
+            captured, processed, dropped = (new - old for new, old in zip(counts, self.stats_counts))
+            self.stats_updated.emit({'captured': captured / elapsed,
+                                     'processed': processed / elapsed,
+                                     'dropped': dropped / elapsed})
+            self.stats_time = now
+            self.stats_counts = counts
 
     def start(self, **kwargs):
         self.running = True
@@ -37,59 +149,109 @@ class CameraThread(QThread):
 
     def stop(self):
         self.running = False
-        self.cam.close()
-        self.cam = None
         self.quit()
         self.wait()
+        self.cam.Close()
+        self.cam = None
 
 
 class ImageProcessing:
     def __init__(self):
         self.frame = None
 
-    def CropImage(self, frame):
-        return frame[540-350:540+350, 540-350:540+350]
+    def CropImage(self, frame, size=ROI_SIZE):
+        # A view, no copy. Frames already cropped by the sensor pass through unchanged
+        h, w = frame.shape[:2]
+        top, left = (h - size) // 2, (w - size) // 2
+        return frame[top:top + size, left:left + size]
 
     def RotateImage(self, frame):
         return cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
 
     def OutputProcessedCameraFrame(self, frame):
+        """
+        BGR camera frame -> cropped, rotated RGB frame.
+        Rotation makes the only copy (of the ROI), the colour swap then runs in place on it
+        """
         frame = self.RotateImage(self.CropImage(frame))
-        return frame
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=frame)
 
     def GetPos(self, frame):
         if frame is not None:
-            w, h, _ = frame.shape
-            Image = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
-            ret, BinaryImage = cv2.threshold(Image, 87, 255, cv2.THRESH_BINARY_INV)
-            kernel = np.ones((5, 5), np.uint8)
-            dilate = cv2.dilate(BinaryImage, kernel, iterations=1)
-            contours, _ = cv2.findContours(dilate, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if contours:
-                contour = max(contours, key=cv2.contourArea)
-                M = cv2.moments(contour)
-                if M["m00"] != 0:
-                    cx = int(M["m10"] / M["m00"])
-                    cy = int(M["m01"] / M["m00"])
-                    return np.array([cx, cy])
+            detection = DetectRobot(frame)
+            if detection is not None:
+                cx, cy, _ = detection
+                return np.array([int(cx), int(cy)])
 
         return None
 
 
+class OverlayState:
+    """
+    CameraHandler attribute that marks the overlay for re-rendering whenever
+    it is assigned. The games assign new arrays/flags rather than editing them in place.
+    """
+    def __set_name__(self, owner, name):
+        self.name = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return obj.__dict__.get(self.name)
+
+    def __set__(self, obj, value):
+        obj.__dict__[self.name] = value
+        obj.overlay_dirty = True
+
+
+class ResizeWatcher(QObject):
+    """Calls callback when the watched widget is resized"""
+    def __init__(self, widget: QWidget, callback):
+        super().__init__(widget)
+        self.callback = callback
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Resize:
+            self.callback()
+        return False
+
+
 class CameraHandler:
+    drawn_points = OverlayState()
+    point = OverlayState()
+    outlined_points = OverlayState()
+    outline = OverlayState()
+    drawn_line = OverlayState()
+    line = OverlayState()
+    increment = OverlayState()
+    ElementsFrame = OverlayState()
+
     def __init__(self, window: QMainWindow):
         self.window = window
 
         self.CameraThread = CameraThread()
         self.ImageProcessing = ImageProcessing()
+        self.Positions = self.CameraThread.Positions
 
         self.InitializeUi()
         self.ConnectSignals()
         self.StartThread()
 
+        # EDUMAG_RECORD=<folder> records every camera window into a timestamped session there
+        record_folder = os.environ.get('EDUMAG_RECORD')
+        if record_folder:
+            self.CameraThread.Recorder.Start(folder=record_folder)
+
         self.ShowFrame = False
         self.frame = None
         self.ElementsFrame = None
+        self.overlay_bbox = None  # (top, bottom, left, right) of everything drawn on ElementsFrame
+        self.overlay_mask = None  # drawn pixels inside overlay_bbox
+        self.overlay_dirty = True
+        self.CameraStats = None
+        self.display_ms = 0.0  # GUI thread time per displayed frame, moving average
+        self.confidence = 0.0
 
         self.drawn_points = None
         self.point = False
@@ -110,9 +272,17 @@ class CameraHandler:
         self.CamScene = QGraphicsScene()
         self.CamView.setScene(self.CamScene)
 
+        # One item for the whole session, frames are uploaded into it in place
+        self.CamPixmapItem = QGraphicsPixmapItem()
+        self.CamScene.addItem(self.CamPixmapItem)
+        self.display_buffer = None
+        self.display_image = None
+        self.ResizeWatcher = ResizeWatcher(self.CamView, self.FitCamView)
+
     def ConnectSignals(self):
         self.CameraCheckbox.toggled.connect(self.CamEnabled)
-        self.CameraThread.frame_captured.connect(self.DisplayFrame)
+        self.CameraThread.frame_ready.connect(self.TakeFrame)
+        self.CameraThread.stats_updated.connect(self.ShowCameraStats)
 
     def StartThread(self):
         self.CameraThread.start()
@@ -126,26 +296,72 @@ class CameraHandler:
             self.ShowFrame = False
             self.CameraThread.running = False
 
+    def TakeFrame(self):
+        frame, _ = self.CameraThread.LatestFrame.Take()
+        if frame is not None:
+            self.DisplayFrame(frame)
+
+    def ShowCameraStats(self, stats: dict):
+        self.CameraStats = stats
+        self.CamView.setToolTip(f"captured {stats['captured']:.1f} fps, processed {stats['processed']:.1f} fps, "
+                                f"dropped {stats['dropped']:.1f} fps, display {self.display_ms:.2f} ms/frame")
+
     def DisplayFrame(self, frame):
         if self.ShowFrame:
-            self.CamScene.clear()
+            start = time.perf_counter()
             self.frame = frame
+            buffer = self.DisplayBuffer(frame.shape)
+            np.copyto(buffer, frame)
+
             if self.point or self.outline or self.line:
-                self.ElementsFrame = np.zeros_like(frame, dtype=np.uint8)
-                self.DrawPoints()
-                self.DrawLines()
-                self.HighlightElements()
-                
-                frame = cv2.addWeighted(frame, 0.9, self.ElementsFrame, 1.0, 10)
-
-            
-            w, h, ch = frame.shape
-            bytes_per_line = ch * w
-            q_img = QImage(frame.data, w, h, bytes_per_line, QImage.Format_RGB888)
-            self.CamScene.addPixmap(QPixmap.fromImage(q_img))
-            self.CamView.fitInView(self.CamScene.sceneRect(), Qt.KeepAspectRatio)
+                if self.overlay_dirty or self.ElementsFrame is None or self.ElementsFrame.shape != frame.shape:
+                    self.RenderOverlay(frame.shape)
+
+                if self.overlay_bbox is not None:
+                    # Blend only the drawn pixels inside the box, self.frame stays untouched for SaveFrame
+                    top, bottom, left, right = self.overlay_bbox
+                    blended = cv2.addWeighted(frame[top:bottom, left:right], 0.9,
+                                              self.ElementsFrame[top:bottom, left:right], 1.0, 10)
+                    np.copyto(buffer[top:bottom, left:right], blended, where=self.overlay_mask)
+
+            self.CamPixmapItem.setPixmap(QPixmap.fromImage(self.display_image))
+            self.CamPixmapItem.setVisible(True)
+
+            self.display_ms = 0.9 * self.display_ms + 0.1 * (time.perf_counter() - start) * 1e3
+        elif self.CamPixmapItem is not None:
+            self.CamPixmapItem.setVisible(False)
+
+    def DisplayBuffer(self, shape):
+        """
+        Preallocated RGB buffer wrapped once by display_image, reallocated only if the frame size changes
+        """
+        if self.display_buffer is None or self.display_buffer.shape != shape:
+            h, w, ch = shape
+            self.display_buffer = np.empty(shape, dtype=np.uint8)
+            self.display_image = QImage(self.display_buffer.data, w, h, ch * w, QImage.Format_RGB888)
+            self.CamScene.setSceneRect(0, 0, w, h)
+            self.FitCamView()
+        return self.display_buffer
+
+    def FitCamView(self):
+        self.CamView.fitInView(self.CamScene.sceneRect(), Qt.KeepAspectRatio)
+
+    def RenderOverlay(self, shape):
+        """Redraws the retained overlay layer, only called after the drawn elements changed"""
+        self.ElementsFrame = np.zeros(shape, dtype=np.uint8)
+        self.DrawPoints()
+        self.DrawLines()
+        self.HighlightElements()
+
+        mask = self.ElementsFrame.any(axis=2)
+        rows, cols = np.flatnonzero(mask.any(axis=1)), np.flatnonzero(mask.any(axis=0))
+        if rows.size:
+            self.overlay_bbox = (rows[0], rows[-1] + 1, cols[0], cols[-1] + 1)
+            self.overlay_mask = mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1, np.newaxis]
         else:
-            self.CamScene.clear()
+            self.overlay_bbox = None
+            self.overlay_mask = None
+        self.overlay_dirty = False
 
     def DrawPoints(self):
         if self.point:
@@ -168,17 +384,36 @@ class CameraHandler:
                            thickness=1, radius=5, color=color)
 
     def DrawLines(self):
-        if self.line:
-            m, n = self.drawn_line.shape
-            for i in range(0, m-1, self.increment):
-                color = tuple(int(c) for c in self.drawn_line[i][2:5])
-                cv2.line(self.ElementsFrame, (int(self.drawn_line[i][0]), int(self.drawn_line[i][1])),
-                         (int(self.drawn_line[i+1][0]), int(self.drawn_line[i+1][1])),
-                         color=color, thickness=1)
-                
-
-    def SendRobotPos(self):
-        return self.ImageProcessing.GetPos(self.frame)
+        if self.line and self.drawn_line is not None and len(self.drawn_line) > 1:
+            # Segment i -> i+1 for every increment-th row, coloured by its first row
+            # NaN rows (StrokeBuffer gaps between strokes) break the line
+            starts = np.arange(0, len(self.drawn_line) - 1, self.increment)
+            segments = np.stack((self.drawn_line[starts, :2], self.drawn_line[starts + 1, :2]), axis=1)
+            starts = starts[~np.isnan(segments).any(axis=(1, 2))]
+            if starts.size == 0:
+                return
+            segments = np.stack((self.drawn_line[starts, :2], self.drawn_line[starts + 1, :2]), axis=1).astype(np.int32)
+            colors = self.drawn_line[starts, 2:5].astype(int)
+
+            # One polylines call per run of equal colour instead of one cv2.line per segment,
+            # runs keep the drawing order so newer strokes still cover older ones
+            bounds = np.flatnonzero(np.any(np.diff(colors, axis=0) != 0, axis=1)) + 1
+            for first, last in zip(np.r_[0, bounds], np.r_[bounds, len(starts)]):
+                cv2.polylines(self.ElementsFrame, segments[first:last], isClosed=False,
+                              color=tuple(int(c) for c in colors[first]), thickness=1)
+
+    def SendRobotPos(self, max_age: float = 0.5):
+        """
+        Latest position tracked by the camera thread, no image work on the caller's thread
+        :param max_age: seconds before a position counts as lost
+        :return: np.array([x, y]) or None
+        """
+        latest = self.Positions.Latest(max_age)
+        if latest is None:
+            self.confidence = 0.0
+            return None
+        self.confidence = latest[4]
+        return latest[1:3].astype(int)
 
     def SaveFrame(self, file_name='img.png', file2_name='images/overlayimg'):
         frame = cv2.addWeighted(self.frame, 0.8, self.ElementsFrame, 1.0, 10)
@@ -194,5 +429,8 @@ class CameraHandler:
         self.ElementsFrame = None
         self.frame = None
         self.CameraThread.stop()
+        self.CameraThread.Recorder.Stop()
+        self.ShowFrame = False  # frames may still be queued for DisplayFrame
         self.CamScene.clear()
+        self.CamPixmapItem = None
         event.accept()
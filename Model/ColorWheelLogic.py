@@ -12,6 +12,7 @@ class PaintWheel(QWidget):
         super().__init__(parent)
         self.CurrentColor = QColor(255, 0, 0)
         self.dragging = False  # Flag to track dragging state
+        self.RingPixmap = None  # ring rendered once per widget size
         self.setMinimumSize(1, 1)
 
     def paintEvent(self, event):
@@ -19,7 +20,24 @@ class PaintWheel(QWidget):
         painter.setRenderHint(QPainter.Antialiasing)
 
         self.DrawRing(painter)
+        ratio = self.devicePixelRatioF()
+        if self.RingPixmap is None or self.RingPixmap.size() != self.size() * ratio:
+            self.RenderRing(ratio)
+        painter.drawPixmap(0, 0, self.RingPixmap)
+        self.DrawMarker(painter)
+
+    def RenderRing(self, ratio: float = 1.0):
+        """
+        Paints the 360 hue slices into RingPixmap, only needed again after a resize
+        """
+        self.RingPixmap = QPixmap(self.size() * ratio)
+        self.RingPixmap.setDevicePixelRatio(ratio)
+        self.RingPixmap.fill(Qt.transparent)
+
+        painter = QPainter(self.RingPixmap)
+        painter.setRenderHint(QPainter.Antialiasing)
         self.ColorRing(painter)
+        painter.end()
 
     def DrawRing(self, painter):
         size = self.size()
@@ -48,6 +66,7 @@ class PaintWheel(QWidget):
         painter.setPen(Qt.NoPen)
         painter.drawEllipse(self.center, int(self.inner_radius), int(self.inner_radius))
 
+    def DrawMarker(self, painter):
         # Draw the color marker indicating the current color
         hue = self.CurrentColor.hue()
         
@@ -99,11 +118,66 @@ class PaintWheel(QWidget):
     def resizeEvent(self, event):
         size = min(event.size().width(), event.size().height())
         self.resize(size, size)
+        self.RingPixmap = None
+
+    def changeEvent(self, event):
+        # The centre is filled with the window colour
+        if event.type() == QEvent.PaletteChange:
+            self.RingPixmap = None
+        super().changeEvent(event)
 
     def CalculateAngle(self, dx, dy):
         return int((math.degrees(math.atan2(dy, dx)) + 360) % 360)
 
     def SetColor(self, color):
+        if color == self.CurrentColor:
+            return  # the joystick repeats the same angle while it is held
         self.CurrentColor = color
         self.colorChanged.emit(color)
         self.update()  # Trigger repaint to update the color wheel
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Repaint time with the ring cached against drawing the 360 slices on every paint
+    import sys
+    import time
+
+    import numpy as np
+
+    app = QApplication(sys.argv)
+
+    class UncachedWheel(PaintWheel):
+        def paintEvent(self, event):
+            painter = QPainter(self)
+            painter.setRenderHint(QPainter.Antialiasing)
+            self.DrawRing(painter)
+            self.ColorRing(painter)
+            self.DrawMarker(painter)
+
+    for size in (150, 300, 600):
+        times = {}
+        images = []
+        for name, wheel in (('uncached', UncachedWheel()), ('cached', PaintWheel())):
+            wheel.resize(size, size)
+            target = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+            wheel.render(target)  # builds the cache once
+
+            repaints = 200
+            start = time.perf_counter()
+            for angle in range(repaints):
+                wheel.UpdateFromJoystickAngle(angle)
+                wheel.render(target)
+            times[name] = (time.perf_counter() - start) / repaints * 1e3
+            images.append(target)
+
+        # Antialiased edges are composited through the transparent pixmap, which rounds a little differently
+        pixels = [np.frombuffer(image.constBits().asstring(image.sizeInBytes()), np.uint8).astype(int) for image in images]
+        difference = np.abs(pixels[0] - pixels[1])
+        print(f'{size}x{size}: repaint {times["uncached"]:.3f} ms uncached, {times["cached"]:.3f} ms cached '
+              f'({times["uncached"] / times["cached"]:.0f}x), max pixel difference {difference.max()}, '
+              f'mean {difference.mean():.3f}')
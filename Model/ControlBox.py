@@ -1,9 +1,9 @@
-import pygame
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 
 from Model.EduMag import EduMagHandler
-from Model.Joystick import JoystickHandler
+from Model.Joystick import JoystickThread
+from Model.Scheduler import GetScheduler
 
 
 class ControlsHandler:
@@ -12,7 +12,7 @@ class ControlsHandler:
 
         self.window = window
         self.Edumag = EduMagHandler(window)
-        self.Joystick = JoystickHandler()
+        self.Joystick = JoystickThread()
         self.Edumag.DisplayField = False
         self.InitializeUi()
         
@@ -46,63 +46,65 @@ class ControlsHandler:
         self.theta_dial.valueChanged.connect(self.OnDialChanged)
 
         self.JoystickCheckbox.toggled.connect(self.HandleInputType)
+        self.Joystick.connected.connect(self.OnJoystickConnected)
+        self.Joystick.state_changed.connect(self.OnJoystickState)
 
     def HandleInputType(self):
         if self.JoystickCheckbox.isChecked():
-            if self.Joystick.initialize_joystick():
-                self.theta_dial.setEnabled(False)
-                self.UpdateJoystickStatus(0)  # Joy Connected
-                self.ConnectTimer()
-            else:
-                self.UpdateJoystickStatus(3)  # Joy Error
+            self.Joystick.start()  # reports back through OnJoystickConnected
 
         else:
             self.theta_dial.setEnabled(True)
             self.DisconnectTimer()
+            self.Joystick.stop()
             self.UpdateJoystickStatus(1)  # Joy Disconnected
 
-    def SetupTimer(self):
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.JoystickLogic)
+    def OnJoystickConnected(self, connected: bool):
+        if connected and self.JoystickCheckbox.isChecked():
+            self.theta_dial.setEnabled(False)
+            self.UpdateJoystickStatus(0)  # Joy Connected
+            self.ConnectTimer()
+        elif not connected:
+            self.UpdateJoystickStatus(3)  # Joy Error
 
+    def SetupTimer(self):
+        self.Scheduler = GetScheduler()
+        self.JoystickStage = None
 
     def ConnectTimer(self, fps=10):
-        self.timer.start(1000 // fps)
+        self.DisconnectTimer()
+        self.JoystickStage = self.Scheduler.AddStage('joystick', self.JoystickLogic, fps, gui=True)
         
     def DisconnectTimer(self):
-        try:
-            self.timer.stop()
-            #self.timer.timeout.disconnect(self.JoystickLogic)
-        except:
-            pass
-
-    def JoystickLogic(self):
-        if self.Joystick.joystick is not None:
-            self.Joystick.ProcessEvents()
-            angle = self.Joystick.get_angle()
-            triggers = self.Joystick.get_triggers()
-
-            if angle is not None:
-                self.theta_dial.setValue(self.TranslateThetaToDial(int(angle)))
-                self.theta_spinbox.setValue(angle)
-                self.SendParams(Reset=False)
-                self.overload_trigger = False
+        self.Scheduler.RemoveStage(self.JoystickStage)
+        self.JoystickStage = None
+
+    def OnJoystickState(self, state: dict):
+        # Latest stick angle, the input thread coalesces these to the 10 Hz of the ramp below
+        angle = state['left']
+        if angle is not None:
+            self.theta_dial.setValue(self.TranslateThetaToDial(int(angle)))
+            self.theta_spinbox.setValue(angle)
+            self.SendParams(Reset=False)
+            self.overload_trigger = False
 
-            else:
-                if self.overload_trigger is not True:
-                    self.SendParams(Reset=True)  # sends 0, 0, 0, 0
-                    self.overload_trigger = True
+        else:
+            if self.overload_trigger is not True:
+                self.SendParams(Reset=True)  # sends 0, 0, 0, 0
+                self.overload_trigger = True
 
-            self.B_spinbox.setValue(self.B_spinbox.value() + triggers)
+    def JoystickLogic(self):
+        # Triggers ramp B at a fixed rate for as long as they are held
+        state = self.Joystick.state
+        if state is not None:
+            self.B_spinbox.setValue(self.B_spinbox.value() + state['triggers'])
             self.UpdateMinMax()
             self.G_spinbox.setValue(self.GetMaxG(self.B_spinbox.value()) * 0.3)
+            if state['left'] is not None and state['triggers']:
+                self.SendParams(Reset=False)
 
-    def GetJoyButtons(self):
-        input = self.Joystick.GetJoystickButtons()
-        return input
-
-    def GetRightStickValue(self):
-        return self.Joystick.MapRightStick()
+    def IsJoyButtonHeld(self, button: str) -> bool:
+        return self.Joystick.IsHeld(button)
 
     def UpdateJoystickStatus(self, idx: int):
         if idx == 0:
@@ -158,7 +160,7 @@ class ControlsHandler:
 
 
     def closeEvent(self):
-        if pygame.joystick.get_init():
-            self.Joystick.QuitPygame()
-            
+        self.DisconnectTimer()
+        self.Joystick.stop()
+
         self.Edumag.closeEvent()
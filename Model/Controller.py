@@ -0,0 +1,213 @@
+import numpy as np
+
+import threading
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from Model.EduMag import EduMag
+from Model.Scheduler import GetScheduler
+
+
+class PositionController(QObject):
+    """
+    Closed-loop position control from camera feedback.
+    Runs a PID law on the tracked pixel position as a fixed-rate stage of the control
+    scheduler and commands a field (B, G, theta) through EduMagHandler.UpdateCurrents.
+    Between camera frames the position is extrapolated with the measured velocity, so
+    every tick produces a fresh setpoint. Frame +x is field +x, frame +y is field -y.
+    Loop rate and jitter are in the scheduler's stats under the stage name.
+    """
+    command = pyqtSignal(float, float, int)  # B (mT), G (mT/m), theta (deg)
+    reset = pyqtSignal()  # target reached, tracking lost or stopped
+    target_reached = pyqtSignal()
+
+    def __init__(self, positions, edumag=None, rate: float = 100.0, B: float = 10.0, max_G: float = None,
+                 kp: float = 6.0, ki: float = 0.0, kd: float = 0.6, tolerance: float = 8.0,
+                 max_age: float = 0.25, name: str = 'position control'):
+        """
+        :param positions: PositionBuffer of the camera thread
+        :param edumag: EduMagHandler, command and reset are connected to it
+        :param rate: control loop rate in Hz
+        :param max_G: gradient limit, further capped per direction to what the coils can drive at B
+        :param tolerance: distance in pixels that counts as reached
+        :param max_age: seconds without a tracked position before the coils are reset
+        """
+        super().__init__()
+        self.positions = positions
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.B = B
+        self.max_G = max_G if max_G is not None else 0.9 * (-38.5633 * B + 997.3362)
+
+        # SetFieldForce returns zeros past the current limit, so saturate just below it
+        solver = edumag.Edumag if edumag is not None else EduMag()
+        self.G_limits = np.minimum(0.95 * solver.MaxForceTable(B), self.max_G)
+        self.kp, self.ki, self.kd = kp, ki, kd
+        self.tolerance = tolerance
+        self.max_age = max_age
+
+        self.lock = threading.Lock()
+        self.target = None
+        self.integral = np.zeros(2)
+        self.engaged = False  # coils currently driven by this loop
+
+        self.name = name
+        self.scheduler = GetScheduler()
+        self.stage = None
+
+        if edumag is not None:
+            self.command.connect(edumag.UpdateCurrents)
+            self.reset.connect(edumag.ResetCurrents)
+
+    def SetTarget(self, target) -> None:
+        """
+        :param target: [x, y] in processed frame pixels, None to stop driving
+        """
+        with self.lock:
+            self.target = None if target is None else np.asarray(target, dtype=float).flatten()[:2]
+            self.integral = np.zeros(2)
+
+    def start(self):
+        if self.stage is None:
+            self.stage = self.scheduler.AddStage(self.name, self.Tick, self.rate)
+
+    def stop(self):
+        self.scheduler.RemoveStage(self.stage)
+        self.stage = None
+        self.Release()
+
+    def Tick(self):
+        self.Step(time.monotonic())
+
+    def Step(self, now: float) -> None:
+        with self.lock:
+            target = self.target
+
+        if target is None:
+            self.Release()
+            return
+
+        state = self.Estimate(now)
+        if state is None:
+            self.Release()  # never drive blind
+            return
+        pos, velocity = state
+
+        error = target - pos
+        if np.linalg.norm(error) <= self.tolerance:
+            with self.lock:
+                if self.target is target:
+                    self.target = None
+            self.Release()
+            self.target_reached.emit()
+            return
+
+        self.integral += error * self.period
+        u = self.kp * error + self.ki * self.integral - self.kd * velocity
+
+        theta = int(round(np.degrees(np.arctan2(-u[1], u[0])))) % 360
+        G = float(min(np.linalg.norm(u), self.G_limits[theta]))
+        self.command.emit(self.B, G, theta)
+        self.engaged = True
+
+    def Estimate(self, now: float):
+        """
+        Position extrapolated to now from the last tracked positions
+        :return: (pos, velocity) in px and px/s, or None if the track is stale
+        """
+        recent = self.positions.Recent(4)
+        if len(recent) == 0 or now - recent[-1, 0] > self.max_age:
+            return None
+
+        velocity = np.zeros(2)
+        if len(recent) > 1:
+            dt = recent[-1, 0] - recent[0, 0]
+            if dt > 0:
+                velocity = (recent[-1, 1:3] - recent[0, 1:3]) / dt
+        return recent[-1, 1:3] + velocity * (now - recent[-1, 0]), velocity
+
+    def Release(self) -> None:
+        if self.engaged:
+            self.reset.emit()
+            self.engaged = False
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Headless closed loop against the simulated coils and camera: time to reach targets and loop jitter
+    from PyQt5.QtCore import QCoreApplication, QTimer
+    import sys
+
+    app = QCoreApplication(sys.argv)
+
+    from Model.Camera import CameraThread
+    from Model.SerialCom import ArduinoController, SerialWorker, SIMULATOR_PORT
+    from Model.Simulator import SyntheticCamera, GetSimulator
+
+    arduino = ArduinoController()
+    arduino.set_port(SIMULATOR_PORT)
+    assert arduino.connect()
+    worker = SerialWorker(arduino)
+    worker.start()
+
+    solver = EduMag()
+
+    class Handler:
+        # The parts of EduMagHandler the controller talks to, without the window
+        Edumag = solver
+
+        def UpdateCurrents(self, B, G, theta):
+            worker.SubmitCurrents(solver.SetFieldForce(B, G, theta))
+
+        def ResetCurrents(self):
+            worker.Reset()
+
+    handler = Handler()
+    camera = CameraThread(backend=SyntheticCamera(simulator=GetSimulator()))
+    camera.start()
+    controller = PositionController(camera.Positions, handler)
+
+    rng = np.random.default_rng(1)
+    targets = [np.array([350, 350]) + rng.uniform(-80, 80, 2) for _ in range(8)]
+    times = []
+    stats = []
+
+    def NextTarget():
+        if len(times) == len(targets):
+            app.quit()
+            return
+        times.append(time.monotonic())
+        controller.SetTarget(targets[len(times) - 1])
+
+    def Reached():
+        times[-1] = time.monotonic() - times[-1]
+        pos = camera.Positions.Latest()[1:3]
+        print(f'target {len(times)}: {targets[len(times) - 1].astype(int)} reached in {times[-1]:.2f} s '
+              f'(at {pos.astype(int)})')
+        NextTarget()
+
+    controller.target_reached.connect(Reached)
+    controller.scheduler.stats_updated.connect(lambda all_stats: stats.append(all_stats[controller.name])
+                                               if controller.name in all_stats else None)
+    controller.start()
+    QTimer.singleShot(500, NextTarget)
+    QTimer.singleShot(60000, app.quit)
+    app.exec_()
+
+    controller.stop()
+    controller.scheduler.stop()
+    camera.stop()
+    worker.stop()
+    arduino.disconnect()
+
+    assert len(times) == len(targets), 'not every target was reached'
+    print(f'median time to target: {np.median(times):.2f} s')
+    rates = [s['rate'] for s in stats]
+    print(f"loop: {np.mean(rates):.1f} Hz, jitter mean {np.mean([s['jitter_mean'] for s in stats]):.3f} ms, "
+          f"p99 {np.max([s['jitter_p99'] for s in stats]):.3f} ms, max {np.max([s['jitter_max'] for s in stats]):.3f} ms, "
+          f"overruns {sum(s['overruns'] for s in stats)}")
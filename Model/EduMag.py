@@ -1,46 +1,141 @@
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Qt5Agg')
 import time
 
 import os
 import sys
 
+from Model.FieldMap import GetFieldModel
+
 def resource_path(file_path):
     if hasattr(sys, "_MEIPASS"):
         return os.path.join(sys._MEIPASS, file_path)
     return os.path.abspath(file_path)
 
 class EduMag:
-    def __init__(self):
+    def __init__(self, use_lut: bool = True):
         self.B_vec = np.array([[-0.00340, -0.00030, 0.00340, 0.00030], [-0.00030, 0.00340, 0.00030, -0.00340]])
         self.Grad_X = np.array([[-0.23960, 0.16450, -0.23960, 0.16450], [-0.00620, 0.00680, -0.00620, 0.00680]])
         self.Grad_Y = np.array([[-0.00680, 0.00620, -0.00680, 0.00620], [0.16450, -0.23960, 0.16450, -0.23960]])
 
+        # Sol only depends on theta, so integer angles are served from a table built on first use
+        self.use_lut = use_lut
+        self.units = None     # (360, 2) unit vectors per degree
+        self.Sol_pinv = None  # (360, 4, 4) pseudo-inverse per degree
+
+    def UseLookupTable(self, units: np.ndarray, Sol_pinv: np.ndarray) -> None:
+        """
+        Reuses tables built by another solver (see FieldMap.GetFieldModel)
+        :param units:
+        :param Sol_pinv:
+        :return:
+        """
+        self.units = units
+        self.Sol_pinv = Sol_pinv
+
+    def BuildLookupTable(self) -> np.ndarray:
+        """
+        Precomputes pinv(Sol) for every integer angle in one stacked call
+        :return: (360, 4, 4) contiguous array indexed by theta in degrees
+        """
+        theta = np.deg2rad(np.arange(360))
+        units = np.stack((np.cos(theta), np.sin(theta)), axis=1)
+
+        Sol = np.empty((360, 4, 4))
+        Sol[:, :2, :] = self.B_vec
+        Sol[:, 2, :] = units.dot(self.Grad_X)
+        Sol[:, 3, :] = units.dot(self.Grad_Y)
+
+        self.units = units
+        self.Sol_pinv = np.ascontiguousarray(np.linalg.pinv(Sol))
+        return self.Sol_pinv
+
     def SetFieldForce(self, B: float, F: float, theta: int) -> np.array:
         B /= 1000
         F /= 1000
-        theta = np.deg2rad(theta)
 
         if B == 0:
             return np.array([0, 0, 0, 0])
 
-        unit = np.array([np.cos(theta), np.sin(theta)])
+        if self.use_lut and float(theta).is_integer():
+            if self.Sol_pinv is None:
+                self.BuildLookupTable()
+            idx = int(theta) % 360
+            unit = self.units[idx]
+            Sol_pinv = self.Sol_pinv[idx]
+
+        else:
+            theta = np.deg2rad(theta)
+            unit = np.array([np.cos(theta), np.sin(theta)])
+            Sol = np.vstack((self.B_vec, unit.dot(self.Grad_X), unit.dot(self.Grad_Y)))
+            Sol_pinv = np.linalg.pinv(Sol)
 
         Breq = np.round(unit * B, 3)
         Freq = np.round(unit * F, 3)
 
-        Sol = np.vstack((self.B_vec, unit.dot(self.Grad_X), unit.dot(self.Grad_Y)))
-        I = np.round(np.linalg.pinv(Sol).dot(np.hstack((Breq, Freq))), 3)
+        I = np.round(Sol_pinv.dot(np.hstack((Breq, Freq))), 3)
 
-        if np.any(I) >= 4:
+        if np.any(abs(I) >= 4):
             return np.array([0, 0, 0, 0])
 
         else:
             return I
 
+    def SetFieldForceBatch(self, B: np.ndarray, F: np.ndarray, theta: np.ndarray) -> np.ndarray:
+        """
+        Vectorized SetFieldForce for N setpoints
+        :param B: (N,) field in mT
+        :param F: (N,) force in the same units as SetFieldForce
+        :param theta: (N,) angle in degrees
+        :return: (N, 4) currents, rows with B == 0 or any |I| >= 4 A are zeroed
+        """
+        B = np.asarray(B, dtype=float).ravel() / 1000
+        F = np.asarray(F, dtype=float).ravel() / 1000
+        theta = np.asarray(theta, dtype=float).ravel()
+
+        integral = np.mod(theta, 1) == 0
+        if self.use_lut and np.all(integral):
+            if self.Sol_pinv is None:
+                self.BuildLookupTable()
+            idx = theta.astype(int) % 360
+            units = self.units[idx]
+            Sol_pinv = self.Sol_pinv[idx]
+
+        else:
+            rad = np.deg2rad(theta)
+            units = np.stack((np.cos(rad), np.sin(rad)), axis=1)
+            Sol = np.empty((len(theta), 4, 4))
+            Sol[:, :2, :] = self.B_vec
+            Sol[:, 2, :] = units.dot(self.Grad_X)
+            Sol[:, 3, :] = units.dot(self.Grad_Y)
+            Sol_pinv = np.linalg.pinv(Sol)
+
+        Breq = np.round(units * B[:, np.newaxis], 3)
+        Freq = np.round(units * F[:, np.newaxis], 3)
+
+        I = np.round(np.einsum('nij,nj->ni', Sol_pinv, np.hstack((Breq, Freq))), 3)
+
+        # Same per-row rules as SetFieldForce
+        I[(B == 0) | np.any(abs(I) >= 4, axis=1)] = 0
+        return I
+
+    def MaxForceTable(self, B: float, limit: float = 4.0) -> np.ndarray:
+        """
+        Largest F that SetFieldForce(B, F, theta) solves without any |I| reaching limit
+        :param B: field in mT
+        :param limit: current limit in A
+        :return: (360,) indexed by theta in degrees, 0 where B alone exceeds the limit
+        """
+        if self.Sol_pinv is None:
+            self.BuildLookupTable()
+        a = np.einsum('nij,nj->ni', self.Sol_pinv[:, :, :2], self.units) * B / 1000  # currents for the field
+        b = np.einsum('nij,nj->ni', self.Sol_pinv[:, :, 2:], self.units) / 1000  # currents per unit of F
+
+        with np.errstate(divide='ignore'):
+            F = np.where(b != 0, (limit - a * np.sign(b)) / np.abs(b), np.inf)
+        F = np.min(F, axis=1)
+        F[np.any(np.abs(a) >= limit, axis=1)] = 0
+        return np.maximum(F, 0)
+
 
 class PlotVectorField:
     def __init__(self):
@@ -48,16 +143,20 @@ class PlotVectorField:
         self.InitPlot()
 
     def InitData(self):
-        filepath = resource_path("Model/VecField_Data.xlsx")
-        self.df = pd.read_excel(filepath)
+        self.FieldMap = GetFieldModel().FieldMap
 
-        self.X = self.df['X'].values
-        self.Y = self.df['Y'].values
+        self.X = self.FieldMap.X
+        self.Y = self.FieldMap.Y
 
-        self.BiX = self.df[['B1X', 'B2X', 'B3X', 'B4X']].values * 1000
-        self.BiY = self.df[['B1Y', 'B2Y', 'B3Y', 'B4Y']].values * 1000
+        self.BiX = self.FieldMap.BiX
+        self.BiY = self.FieldMap.BiY
 
     def InitPlot(self):
+        # matplotlib is only needed for this reference renderer, EduMagHandler uses FieldView
+        import matplotlib
+        matplotlib.use('Qt5Agg')
+        import matplotlib.pyplot as plt
+
         self.fig, self.ax = plt.subplots()
         self.fig.set_dpi(70)
         self.quiver = self.ax.quiver(self.X, self.Y, self.X * 0, self.X * 0, self.X * 0, cmap='jet', animated=True)
@@ -100,24 +199,28 @@ from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 
 from Model.SerialCom import ArduinoController as Serial
+from Model.SerialCom import SerialWorker
+from Model.FieldView import VectorFieldItem
 
 class EduMagHandler:
     def __init__(self, window):
         super().__init__()
 
         self.window = window
+        self.FieldModel = GetFieldModel()
         self.Edumag = EduMag()
+        self.Edumag.UseLookupTable(self.FieldModel.units, self.FieldModel.Sol_pinv)
         self.Serial = Serial()
+        self.SerialWorker = SerialWorker(self.Serial)
 
         self.OpenSerialPort()
+        self.SerialWorker.start()
 
-        self.PlotVectorField = PlotVectorField()
-        
         self.DisplayField = False
         self.InitializeUi()
 
         self.last_current = np.array([0, 0, 0, 0])
-        self._background = None
+        self._fitted_size = None
         
     def OpenSerialPort(self):
         try:
@@ -139,11 +242,16 @@ class EduMagHandler:
         if self.VecView is not None:
             self.VecScene = QGraphicsScene()
             self.VecView.setScene(self.VecScene)
+            field = self.FieldModel.FieldMap
+            self.VecFieldItem = VectorFieldItem(field.X, field.Y)
+            self.VecScene.addItem(self.VecFieldItem)
         self.CurrentsLabel = self.window.findChild(QLabel, "CurrentsLabel")
         self.VecViewCheckbox = self.window.findChild(QCheckBox, "VecFieldCheckBox")
 
     def UpdateCurrents(self, B: float, G: float, theta: int) -> None:
-        I = self.Edumag.SetFieldForce(B, G, theta)
+        self.SetCurrents(self.Edumag.SetFieldForce(B, G, theta))
+
+    def SetCurrents(self, I: np.ndarray) -> None:
         if np.any(abs(I) > 4):
             return
         if np.all(self.last_current != I):
@@ -158,61 +266,88 @@ class EduMagHandler:
                 
 
     def UpdateField(self, I):
-        self.PlotVectorField.DrawField(I)
-        self.PlotField(self.PlotVectorField.fig)
+        field = self.FieldModel.FieldMap
+        self.PlotField(field.BiX.dot(I), field.BiY.dot(I))
 
 
     def GetCurrents(self, B: float, G: float, theta: int) -> np.ndarray:
         return self.Edumag.SetFieldForce(B, G, theta)
 
+    def GetCurrentsBatch(self, B: np.ndarray, G: np.ndarray, theta: np.ndarray) -> np.ndarray:
+        return self.Edumag.SetFieldForceBatch(B, G, theta)
+
     def ResetCurrents(self):
-        _ = self.Serial.reset()
+        self.SerialWorker.Reset()
+        # The coils are off now, so the next setpoint must not be compared against the old one
+        self.last_current = np.array([0, 0, 0, 0])
 
-    def PlotField(self, fig):
+    def PlotField(self, BXnet, BYnet):
         if self.VecView is not None:
-            canvas = fig.canvas
-            ax = fig.axes[0]
-            
-            if self._background is None:
-                canvas.draw()
-                self._background = canvas.copy_from_bbox(fig.bbox)
-            
-            canvas.restore_region(self._background)
+            self.VecFieldItem.SetField(BXnet, BYnet)
 
-                            
-            ax.draw_artist(self.PlotVectorField.quiver)
-            canvas.blit(ax.bbox)
-                
-            #canvas.blit(canvas.figure.bbox)
-            w, h = canvas.get_width_height()
-            buffer = canvas.buffer_rgba()
-            q_img = QImage(buffer, w, h, QImage.Format_RGBA8888)
-            pixmap = QPixmap.fromImage(q_img)
-            if self.VecScene.items():
-                self.VecScene.items()[0].setPixmap(pixmap)
-
-            else:
-                self.VecScene.addItem(QGraphicsPixmapItem(pixmap))
-            self.ResizeVecField()
-        else:
-            pass
+            # Only refit when the view changed size since the last fit
+            if self._fitted_size != self.VecView.size():
+                self.ResizeVecField()
 
     def UpdateLabels(self, I):
         if self.CurrentsLabel is not None:
             self.CurrentsLabel.setText(f'I1 = {I[0]:.2f}A, I2 = {I[1]:.2f}A, I3 = {I[2]:.2f}A, I4 = {I[3]:.2f}A ')
 
     def SendCurrents(self, I):
-        self.Serial.set_target_currents(I)
+        # Never blocks, the worker thread writes the newest setpoint when the UART is free
+        self.SerialWorker.SubmitCurrents(I)
 
     def ResizeVecField(self):
-        self.VecView.fitInView(self.VecScene.sceneRect(), Qt.KeepAspectRatio)
+        if self.VecView is not None:
+            self.VecView.fitInView(self.VecScene.sceneRect(), Qt.KeepAspectRatio)
+            self._fitted_size = self.VecView.size()
 
     def resizeEvent(self):
         self.ResizeVecField()
         
     def closeEvent(self):
+        self.SerialWorker.stop()
         status = self.Serial.disconnect()
         if status:
             print("Serial Disconnected")
         else:
             print("serial didn't disconnect properly")
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # python -m Model.EduMag from the repo root (the Model.* imports need the package path)
+    import timeit
+
+    rng = np.random.default_rng(0)
+    requests = [(rng.uniform(1, 20), rng.uniform(0, 300), int(t)) for t in rng.integers(0, 360, 2000)]
+
+    pinv_solver = EduMag(use_lut=False)
+    lut_solver = EduMag(use_lut=True)
+
+    build_time = timeit.timeit(lut_solver.BuildLookupTable, number=1)
+
+    for B, F, theta in requests:
+        assert np.array_equal(pinv_solver.SetFieldForce(B, F, theta), lut_solver.SetFieldForce(B, F, theta))
+
+    def run(solver):
+        for B, F, theta in requests:
+            solver.SetFieldForce(B, F, theta)
+
+    t_pinv = min(timeit.repeat(lambda: run(pinv_solver), number=1, repeat=5)) / len(requests)
+    t_lut = min(timeit.repeat(lambda: run(lut_solver), number=1, repeat=5)) / len(requests)
+
+    print(f'Table build: {build_time * 1e3:.2f} ms')
+    print(f'pinv per call: {t_pinv * 1e6:.1f} us')
+    print(f'LUT per call: {t_lut * 1e6:.1f} us ({t_pinv / t_lut:.1f}x)')
+
+    B, F, theta = (np.array(col) for col in zip(*requests))
+    batch = lut_solver.SetFieldForceBatch(B, F, theta)
+    assert np.array_equal(batch, np.array([pinv_solver.SetFieldForce(*row) for row in requests]))
+
+    t_batch = min(timeit.repeat(lambda: lut_solver.SetFieldForceBatch(B, F, theta), number=1, repeat=5)) / len(requests)
+    print(f'Batch per row: {t_batch * 1e6:.2f} us ({t_pinv / t_batch:.1f}x)')
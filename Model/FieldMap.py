@@ -0,0 +1,136 @@
+import numpy as np
+
+import hashlib
+import json
+import os
+import sys
+import threading
+
+
+def resource_path(file_path):
+    if hasattr(sys, "_MEIPASS"):
+        return os.path.join(sys._MEIPASS, file_path)
+    return os.path.abspath(file_path)
+
+
+XLSX_PATH = "Model/VecField_Data.xlsx"
+
+# Row layout of the cached (10, N) array
+ROWS = ['X', 'Y', 'B1X', 'B2X', 'B3X', 'B4X', 'B1Y', 'B2Y', 'B3Y', 'B4Y']
+
+
+class FieldMap:
+    """
+    Coil field map (X, Y and per-coil BiX/BiY in mT per A).
+    Parsed from the xlsx once, then memory-mapped from a .npy compiled next to it.
+    """
+    def __init__(self, xlsx_path: str = XLSX_PATH):
+        self.xlsx_path = resource_path(xlsx_path)
+        base, _ = os.path.splitext(self.xlsx_path)
+        self.cache_path = base + '.npy'
+        self.meta_path = base + '.json'
+
+        self.data = self.Load()
+
+        self.X = self.data[0]
+        self.Y = self.data[1]
+        self.BiX = self.data[2:6].T
+        self.BiY = self.data[6:10].T
+
+    def Load(self) -> np.ndarray:
+        source = self.SourceInfo()
+        meta = self.ReadMeta()
+
+        if meta is not None and os.path.exists(self.cache_path):
+            fresh = meta.get('mtime') == source['mtime'] and meta.get('size') == source['size']
+
+            # mtime can change without the contents changing (copies, checkouts)
+            if not fresh and meta.get('sha1') == self.HashSource():
+                fresh = True
+                self.WriteMeta(dict(meta, mtime=source['mtime'], size=source['size']))
+
+            if fresh:
+                try:
+                    return np.load(self.cache_path, mmap_mode='r')
+                except (OSError, ValueError) as e:
+                    print(f'Error loading field map cache: {e}')
+
+        return self.Rebuild(source)
+
+    def Rebuild(self, source: dict) -> np.ndarray:
+        import pandas as pd  # only needed when the cache is stale
+
+        df = pd.read_excel(self.xlsx_path)
+        data = np.ascontiguousarray(df[ROWS].values.T, dtype=np.float64)
+        data[2:] *= 1000
+
+        try:
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'wb') as file:
+                np.save(file, data)
+            os.replace(tmp_path, self.cache_path)
+            self.WriteMeta(dict(source, sha1=self.HashSource()))
+            return np.load(self.cache_path, mmap_mode='r')
+
+        except OSError as e:
+            # Read-only install, keep the parsed copy in memory
+            print(f'Error writing field map cache: {e}')
+            data.setflags(write=False)
+            return data
+
+    def SourceInfo(self) -> dict:
+        stat = os.stat(self.xlsx_path)
+        return {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+    def HashSource(self) -> str:
+        with open(self.xlsx_path, 'rb') as file:
+            return hashlib.sha1(file.read()).hexdigest()
+
+    def ReadMeta(self):
+        try:
+            with open(self.meta_path, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def WriteMeta(self, meta: dict) -> None:
+        try:
+            with open(self.meta_path, 'w') as file:
+                json.dump(meta, file)
+        except OSError as e:
+            print(f'Error writing field map cache: {e}')
+
+
+class FieldModel:
+    """
+    Field map and solver tables shared by every EduMagHandler in the process.
+    All arrays are read-only views, handlers must not modify them.
+    """
+    def __init__(self):
+        from Model.EduMag import EduMag
+
+        self.FieldMap = FieldMap()
+
+        solver = EduMag()
+        solver.BuildLookupTable()
+        self.units = solver.units
+        self.Sol_pinv = solver.Sol_pinv
+        self.units.setflags(write=False)
+        self.Sol_pinv.setflags(write=False)
+
+
+_field_model = None
+_field_model_lock = threading.Lock()
+
+
+def GetFieldModel() -> FieldModel:
+    """
+    Returns the process-wide FieldModel, building it on first use
+    :return:
+    """
+    global _field_model
+    if _field_model is None:
+        with _field_model_lock:
+            if _field_model is None:
+                _field_model = FieldModel()
+    return _field_model
@@ -0,0 +1,204 @@
+import numpy as np
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import *
+
+
+def JetLUT(n: int = 256) -> list:
+    """
+    Returns n QColors sampled from the jet colormap (same map PlotVectorField used)
+    :param n:
+    :return:
+    """
+    x = np.linspace(0, 1, n)
+    rgb = np.clip(1.5 - np.abs(4 * x[:, np.newaxis] - np.array([3, 2, 1])), 0, 1)
+    rgb = (rgb * 255).astype(np.uint8)
+    return [QColor(int(r), int(g), int(b)) for r, g, b in rgb]
+
+
+class VectorFieldItem(QGraphicsItem):
+    """
+    Draws the coil field as coloured arrows straight from the BXnet/BYnet arrays.
+    Arrows share one cached unit path, colours come from a precomputed LUT and
+    the colorbar spans min(Bnet)..max(Bnet) like PlotVectorField.DrawField.
+    """
+    def __init__(self, X: np.ndarray, Y: np.ndarray, lut_size: int = 256, parent=None):
+        super().__init__(parent)
+
+        self.lut = JetLUT(lut_size)
+        self.brushes = [QBrush(color) for color in self.lut]
+
+        # Field coordinates are mm with y up, the scene has y down
+        self.px = np.asarray(X, dtype=float)
+        self.py = -np.asarray(Y, dtype=float)
+
+        spacing = np.diff(np.unique(self.px))
+        self.spacing = float(spacing.min()) if spacing.size else 1.0
+
+        x_min, x_max = self.px.min() - self.spacing, self.px.max() + self.spacing
+        y_min, y_max = self.py.min() - self.spacing, self.py.max() + self.spacing
+        self.plot_rect = QRectF(x_min, y_min, x_max - x_min, y_max - y_min)
+
+        bar_w = self.plot_rect.width() * 0.05
+        self.bar_rect = QRectF(self.plot_rect.right() + bar_w, self.plot_rect.top(), bar_w, self.plot_rect.height())
+
+        self.font = QFont()
+        self.font.setPointSizeF(self.spacing * 0.45)
+        margin = self.spacing * 3
+        self.bounds = QRectF(self.plot_rect.left() - margin, self.plot_rect.top(),
+                             self.bar_rect.right() + margin * 2 - self.plot_rect.left() + margin,
+                             self.plot_rect.height() + margin)
+
+        self.arrow = self.ArrowPath()
+        self.bar_image = self.ColorBarImage()
+
+        self.angles = np.zeros_like(self.px)
+        self.lengths = np.zeros_like(self.px)
+        self.colors = np.zeros(self.px.shape, dtype=int)
+        self.clim = (0.0, 0.0)
+
+        self.setCacheMode(QGraphicsItem.NoCache)
+
+    def ArrowPath(self) -> QPainterPath:
+        """
+        Unit arrow along +x, scaled and rotated per vector at paint time
+        :return:
+        """
+        path = QPainterPath()
+        path.addPolygon(QPolygonF([
+            QPointF(0.0, -0.04), QPointF(0.7, -0.04), QPointF(0.7, -0.15), QPointF(1.0, 0.0),
+            QPointF(0.7, 0.15), QPointF(0.7, 0.04), QPointF(0.0, 0.04)
+        ]))
+        path.closeSubpath()
+        return path
+
+    def ColorBarImage(self) -> QImage:
+        image = QImage(1, len(self.lut), QImage.Format_RGB32)
+        for i, color in enumerate(self.lut):
+            image.setPixel(0, len(self.lut) - 1 - i, color.rgb())
+        return image
+
+    def SetField(self, BXnet: np.ndarray, BYnet: np.ndarray) -> None:
+        Bnet = np.sqrt(BXnet ** 2 + BYnet ** 2)
+        vmin, vmax = float(np.min(Bnet)), float(np.max(Bnet))
+        span = vmax - vmin if vmax > vmin else 1.0
+
+        self.angles = np.degrees(np.arctan2(-BYnet, BXnet))
+        self.lengths = Bnet / (vmax if vmax > 0 else 1.0) * self.spacing * 0.9
+        self.colors = ((Bnet - vmin) / span * (len(self.lut) - 1)).astype(int)
+        self.clim = (vmin, vmax)
+        self.update()
+
+    def boundingRect(self) -> QRectF:
+        return self.bounds
+
+    def paint(self, painter: QPainter, option, widget=None) -> None:
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setPen(Qt.NoPen)
+
+        base = painter.transform()
+        for x, y, angle, length, color in zip(self.px, self.py, self.angles, self.lengths, self.colors):
+            if length <= 0:
+                continue
+            painter.setTransform(QTransform().translate(x, y).rotate(angle).scale(length, length) * base)
+            painter.setBrush(self.brushes[color])
+            painter.drawPath(self.arrow)
+        painter.setTransform(base)
+
+        self.PaintAxes(painter)
+        self.PaintColorBar(painter)
+
+    def PaintAxes(self, painter: QPainter) -> None:
+        painter.setBrush(Qt.NoBrush)
+        painter.setPen(QPen(Qt.black, 0))
+        painter.drawRect(self.plot_rect)
+
+        painter.setFont(self.font)
+        r = self.plot_rect
+        text_h = self.spacing * 1.5
+        painter.drawText(QRectF(r.left(), r.bottom(), r.width(), text_h), Qt.AlignCenter, 'X (mm)')
+
+        painter.save()
+        painter.translate(r.left() - text_h, r.center().y())
+        painter.rotate(-90)
+        painter.drawText(QRectF(-r.height() / 2, -text_h / 2, r.height(), text_h), Qt.AlignCenter, 'Y (mm)')
+        painter.restore()
+
+    def PaintColorBar(self, painter: QPainter) -> None:
+        painter.drawImage(self.bar_rect, self.bar_image)
+        painter.setPen(QPen(Qt.black, 0))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(self.bar_rect)
+
+        vmin, vmax = self.clim
+        text_h = self.spacing * 1.2
+        x = self.bar_rect.right() + self.spacing * 0.3
+        w = self.spacing * 4
+        painter.drawText(QRectF(x, self.bar_rect.top(), w, text_h), Qt.AlignLeft | Qt.AlignTop, f'{vmax:.2f}')
+        painter.drawText(QRectF(x, self.bar_rect.bottom() - text_h, w, text_h), Qt.AlignLeft | Qt.AlignBottom, f'{vmin:.2f}')
+        painter.drawText(QRectF(x, self.bar_rect.center().y() - text_h / 2, w, text_h), Qt.AlignLeft | Qt.AlignVCenter, 'Bnet')
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    import sys
+    import time
+
+    app = QApplication(sys.argv)
+
+    from Model.EduMag import EduMag, PlotVectorField
+    from Model.FieldMap import GetFieldModel
+
+    field = GetFieldModel().FieldMap
+    solver = EduMag()
+    currents = [solver.SetFieldForce(10, 100, theta) for theta in range(0, 360, 3)]
+    frames = 120
+
+    target = QImage(640, 480, QImage.Format_RGB32)
+
+    def RenderScene(scene):
+        target.fill(Qt.white)
+        painter = QPainter(target)
+        scene.render(painter)
+        painter.end()
+
+    # Qt path
+    scene = QGraphicsScene()
+    item = VectorFieldItem(field.X, field.Y)
+    scene.addItem(item)
+
+    start = time.perf_counter()
+    for i in range(frames):
+        I = currents[i % len(currents)]
+        item.SetField(field.BiX.dot(I), field.BiY.dot(I))
+        RenderScene(scene)
+    qt_fps = frames / (time.perf_counter() - start)
+
+    # matplotlib path, same chain EduMagHandler.PlotField used
+    plot = PlotVectorField()
+    canvas = plot.fig.canvas
+    canvas.draw()
+    background = canvas.copy_from_bbox(plot.fig.bbox)
+    mpl_scene = QGraphicsScene()
+    pixmap_item = QGraphicsPixmapItem()
+    mpl_scene.addItem(pixmap_item)
+
+    start = time.perf_counter()
+    for i in range(frames):
+        plot.DrawField(currents[i % len(currents)])
+        canvas.restore_region(background)
+        plot.ax.draw_artist(plot.quiver)
+        canvas.blit(plot.ax.bbox)
+        w, h = canvas.get_width_height()
+        q_img = QImage(canvas.buffer_rgba(), w, h, QImage.Format_RGBA8888)
+        pixmap_item.setPixmap(QPixmap.fromImage(q_img))
+        RenderScene(mpl_scene)
+    mpl_fps = frames / (time.perf_counter() - start)
+
+    print(f'matplotlib: {mpl_fps:.1f} fps')
+    print(f'QGraphicsItem: {qt_fps:.1f} fps ({qt_fps / mpl_fps:.1f}x)')
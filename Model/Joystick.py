@@ -1,5 +1,11 @@
 import pygame
 import math
+import os
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+BUTTONS = {'a': 0, 'b': 1, 'start': 7}
 
 
 class JoystickHandler:
@@ -8,7 +14,6 @@ class JoystickHandler:
         pygame.joystick.init()
         
         self.joystick = None
-        self.button_prev_state = {'a': False, 'b': False, 'start': False}  # Store previous states of buttons
         
     def initialize_joystick(self):
         if not pygame.joystick.get_init():
@@ -70,34 +75,19 @@ class JoystickHandler:
             else:
                 return None
 
-    def GetJoystickButtons(self):
+    def IsButtonHeld(self, button: str) -> bool:
+        """Level of a button right now, for hold actions. Call after events were pumped"""
         if self.joystick is None:
-            return None
-        for event in pygame.event.get():
-            if event.type == pygame.JOYBUTTONDOWN:
-                # Detect button press (rising edge)
-                if event.button == 0 and not self.button_prev_state['a']:  # A button
-                    self.button_prev_state['a'] = True
-                    return 'a'
-                elif event.button == 1 and not self.button_prev_state['b']:  # B button
-                    self.button_prev_state['b'] = True
-                    return 'b'
-                elif event.button == 7 and not self.button_prev_state['start']:  # Start button
-                    self.button_prev_state['start'] = True
-                    return 'start'
-
-            elif event.type == pygame.JOYBUTTONUP:
-                # Reset the button state when the button is released
-                if event.button == 0:
-                    self.button_prev_state['a'] = False
-                elif event.button == 1:
-                    self.button_prev_state['b'] = False
-                elif event.button == 7:
-                    self.button_prev_state['start'] = False
-
-        return None  # Return None if no rising edge is detected
-            
-    
+            return False
+        return bool(self.joystick.get_button(BUTTONS[button]))
+
+    def Snapshot(self) -> dict:
+        """Everything the games read, quantized so unchanged input compares equal"""
+        return {'left': self.get_angle(),
+                'right': self.MapRightStick(),
+                'triggers': round(self.get_triggers(), 2),
+                'buttons': {button: self.IsButtonHeld(button) for button in BUTTONS}}
+
     def ProcessEvents(self):
         if self.joystick is not None:
             pygame.event.pump()
@@ -106,3 +96,157 @@ class JoystickHandler:
         self.joystick = None
         if pygame.joystick.get_init():
             pygame.joystick.quit()
+
+
+class JoystickThread(QThread):
+    """
+    The only owner of pygame. Samples axes and buttons at a fixed rate and publishes a
+    snapshot whenever something changed, plus press/release edges, so no caller has to
+    poll or drain the pygame event queue. Button latency is one sampling period.
+    Snapshots are coalesced to state_rate, only the latest one goes out, because every
+    listener turns a stick move into coil currents.
+    """
+    connected = pyqtSignal(bool)  # after start, False if there is no joystick
+    state_changed = pyqtSignal(object)  # JoystickHandler.Snapshot()
+    button_pressed = pyqtSignal(str)  # 'a', 'b' or 'start'
+    button_released = pyqtSignal(str)
+
+    def __init__(self, rate: float = None, handler=None, state_rate: float = 10):
+        """
+        :param rate: samples per second, EDUMAG_JOYSTICK_RATE or 200
+        :param handler: factory for the device wrapper, JoystickHandler by default
+        :param state_rate: most state_changed signals per second, button edges are not limited
+        """
+        super().__init__()
+        self.rate = rate if rate is not None else float(os.environ.get('EDUMAG_JOYSTICK_RATE', 200))
+        self.handler = handler if handler is not None else JoystickHandler
+        self.state_interval = 1.0 / state_rate
+        self.running = False
+        self.state = None  # last sampled snapshot
+        self.unsent = False  # state changed since the last state_changed
+        self.sent_time = -math.inf
+
+    def IsHeld(self, button: str) -> bool:
+        state = self.state
+        return state is not None and state['buttons'][button]
+
+    def start(self, **kwargs):
+        if self.isRunning():
+            return
+        self.running = True
+        self.state = None
+        self.unsent = False
+        self.sent_time = -math.inf
+        super().start()
+
+    def stop(self):
+        self.running = False
+        self.wait()
+
+    def run(self):
+        device = self.handler()
+        if not device.initialize_joystick():
+            self.running = False
+            self.connected.emit(False)
+            return
+        self.connected.emit(True)
+
+        period = 1.0 / self.rate
+        deadline = time.monotonic()
+        while self.running:
+            device.ProcessEvents()
+            self.Publish(device.Snapshot())
+
+            deadline += period
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()  # fell behind, don't burst
+
+        device.QuitPygame()
+        self.state = None
+
+    def Publish(self, state: dict) -> None:
+        previous = self.state
+        if state != previous:
+            self.state = state
+            self.unsent = True
+
+        # A change inside the interval waits for the next one, by then newer samples may have replaced it
+        now = time.monotonic()
+        if self.unsent and now - self.sent_time >= self.state_interval:
+            self.unsent = False
+            self.sent_time = now
+            self.state_changed.emit(self.state)
+
+        if state == previous:
+            return
+        for button, held in state['buttons'].items():
+            was_held = previous is not None and previous['buttons'][button]
+            if held and not was_held:
+                self.button_pressed.emit(button)
+            elif was_held and not held:
+                self.button_released.emit(button)
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Press-to-slot latency at different sampling rates with a scripted device, and event delivery to two listeners
+    from PyQt5.QtCore import QCoreApplication, QTimer
+    import sys
+
+    import numpy as np
+
+    app = QCoreApplication(sys.argv)
+    rng = np.random.default_rng(0)
+
+    class ScriptedDevice:
+        # Stands in for JoystickHandler: 'a' is held for 60 ms at scripted times, the left stick sweeps slowly
+        presses = None
+        samples = 0
+
+        def initialize_joystick(self):
+            return True
+
+        def ProcessEvents(self):
+            pass
+
+        def Snapshot(self):
+            ScriptedDevice.samples += 1
+            t = time.monotonic()
+            held = bool(np.any((t >= self.presses) & (t < self.presses + 0.06)))
+            return {'left': int(t * 20) % 360, 'right': None, 'triggers': 0.0,
+                    'buttons': {'a': held, 'b': False, 'start': False}}
+
+        def QuitPygame(self):
+            pass
+
+    for rate in (10, 33, 200, 500):
+        start = time.monotonic() + 0.2
+        ScriptedDevice.presses = start + np.cumsum(rng.uniform(0.15, 0.3, 20))
+        ScriptedDevice.samples = 0
+        thread = JoystickThread(rate, ScriptedDevice)
+        received, states, other = [], [], []
+        thread.button_pressed.connect(lambda button: received.append(time.monotonic()))
+        thread.button_pressed.connect(other.append)  # a second game listening at the same time
+        thread.state_changed.connect(states.append)
+
+        thread.start()
+        started = time.monotonic()
+        QTimer.singleShot(int((ScriptedDevice.presses[-1] - time.monotonic() + 0.3) * 1000), app.quit)
+        app.exec_()
+        thread.stop()
+        assert len(states) <= (time.monotonic() - started) / thread.state_interval + 1, 'snapshots not coalesced'
+
+        # Each press is matched to the scripted press just before it
+        received = np.array(received)
+        pressed = ScriptedDevice.presses[np.searchsorted(ScriptedDevice.presses, received) - 1]
+        latency = (received - pressed) * 1e3
+        print(f'{rate:>4} Hz: {len(received)}/{len(ScriptedDevice.presses)} presses seen by both listeners '
+              f'({len(other)}), latency mean {latency.mean():.1f} ms, max {latency.max():.1f} ms, '
+              f'{len(states)} snapshots published from {ScriptedDevice.samples} samples')
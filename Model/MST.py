@@ -1,35 +1,38 @@
-import math
-
-
-test_case = False
+import numpy as np
 
 
 class MST:
-    def __init__(self, nodes):
-        self.nodes = nodes
-        self.num_nodes = len(nodes)
-
-    def _calculate_distance(self, point1, point2):
+    """
+    Euclidean minimum spanning tree of 2D points.
+    Small inputs use Kruskal over every pair, larger ones Kruskal on the Delaunay triangulation,
+    which contains every Euclidean MST edge. Without scipy, or for degenerate inputs, Prim's
+    algorithm on the dense distance matrix takes over (one row at a time, so memory stays O(N)).
+    """
+    def __init__(self, nodes, method: str = 'auto', kruskal_limit: int = 64):
         """
-        Returns Euclidian distance of 2 points
-        :param point1:
-        :param point2:
-        :return:
+        :param nodes: (N, 2) points
+        :param method: 'auto', 'kruskal', 'prim' or 'delaunay'
+        :param kruskal_limit: largest N solved with all-pairs Kruskal in auto mode
         """
-        return math.sqrt((point1[0] - point2[0]) ** 2 + (point1[1] - point2[1]) ** 2)
+        self.nodes = nodes
+        self.points = np.asarray(nodes, dtype=float).reshape(-1, 2)
+        self.num_nodes = len(self.points)
+        self.method = method
+        self.kruskal_limit = kruskal_limit
 
     def _find(self, parent, i):
         """
-        Find the root parent of a node with path compression
+        Find the root parent of a node with path compression, iterative so deep trees can't overflow the stack
         :param parent:
         :param i:
         :return:
         """
-        if parent[i] == i:
-            return i
-        else:
-            parent[i] = self._find(parent, parent[i])
-            return parent[i]
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
 
     def _union(self, parent, rank, x, y):
         """
@@ -52,38 +55,125 @@ class MST:
                 parent[root_y] = root_x
                 rank[root_x] += 1
 
-    def CalculateMST(self):
+    def Edges(self):
         """
-        Entry Point function. Will return the order of points
-        :return:
+        Tree edges in Kruskal order (by length, then node indices)
+        :return: (dist, u, v) arrays with u < v
         """
-        edges = []
-        for i in range(self.num_nodes):
-            for j in range(i+1, self.num_nodes):
-                dist = self._calculate_distance(self.nodes[i], self.nodes[j])
-                edges.append((dist, i, j))
+        n = self.num_nodes
+        if n < 2:
+            return np.zeros(0), np.zeros(0, dtype=int), np.zeros(0, dtype=int)
 
-        edges.sort()
+        method = self.method
+        if method == 'auto':
+            method = 'kruskal' if n <= self.kruskal_limit else 'delaunay'
+
+        if method == 'delaunay':
+            candidates = self.DelaunayEdges()
+            if candidates is None:
+                method = 'prim'  # no scipy, or degenerate input (collinear, duplicates)
+            else:
+                return self.Kruskal(*candidates)
+
+        if method == 'prim':
+            u, v = self.Prim()
+            dist = self.Distance(u, v)
+            order = np.lexsort((v, u, dist))
+            return dist[order], u[order], v[order]
 
+        u, v = np.triu_indices(n, 1)
+        return self.Kruskal(self.Distance(u, v), u, v)
+
+    def Distance(self, u, v):
+        # Same arithmetic as math.sqrt(dx ** 2 + dy ** 2), so ties resolve like they always did
+        d = self.points[u] - self.points[v]
+        return np.sqrt(d[:, 0] ** 2 + d[:, 1] ** 2)
+
+    def Kruskal(self, dist, u, v):
+        """
+        Kruskal over candidate edges, ties broken by (u, v) like sorting (dist, u, v) tuples
+        :return: (dist, u, v) of the tree edges in the order they were taken
+        """
+        order = np.lexsort((v, u, dist))
         parent = list(range(self.num_nodes))
         rank = [0] * self.num_nodes
 
-        connected_points = []
-
-        for dist, u, v in edges:
-            root_u = self._find(parent, u)
-            root_v = self._find(parent, v)
+        taken = []
+        for k in order.tolist():
+            root_u = self._find(parent, int(u[k]))
+            root_v = self._find(parent, int(v[k]))
 
             # Prevent Cycles
             if root_u != root_v:
-                connected_points.append([
-                    int(self.nodes[u][0]), int(self.nodes[u][1]),
-                    int(self.nodes[v][0]), int(self.nodes[v][1])
-                ])
-
+                taken.append(k)
                 self._union(parent, rank, root_u, root_v)
+                if len(taken) == self.num_nodes - 1:
+                    break
+
+        taken = np.array(taken, dtype=int)
+        return dist[taken], u[taken], v[taken]
+
+    def Prim(self):
+        """
+        Prim's algorithm on the dense distance matrix, O(N^2) time with N vectorized steps
+        :return: (u, v) of the tree edges with u < v
+        """
+        n = self.num_nodes
+        in_tree = np.zeros(n, dtype=bool)
+        best = np.full(n, np.inf)  # squared distance from the tree
+        link = np.zeros(n, dtype=int)
+
+        current = 0
+        in_tree[0] = True
+        u, v = np.empty(n - 1, dtype=int), np.empty(n - 1, dtype=int)
+        for k in range(n - 1):
+            d = self.points - self.points[current]
+            d = d[:, 0] ** 2 + d[:, 1] ** 2
+            closer = (d < best) & ~in_tree
+            best[closer] = d[closer]
+            link[closer] = current
+
+            best[in_tree] = np.inf
+            current = int(np.argmin(best))
+            in_tree[current] = True
+            u[k], v[k] = link[current], current
+
+        return np.minimum(u, v), np.maximum(u, v)
+
+    def DelaunayEdges(self):
+        """
+        :return: (dist, u, v) of the unique Delaunay edges, or None if it can't be built
+        """
+        try:
+            from scipy.spatial import Delaunay, QhullError
+        except ImportError:
+            return None
+
+        try:
+            simplices = Delaunay(self.points).simplices
+        except (QhullError, ValueError):
+            return None
+
+        edges = np.concatenate((simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]))
+        edges = np.unique(np.sort(edges, axis=1), axis=0)
+        u, v = edges[:, 0], edges[:, 1]
+
+        # Duplicate points are left out of the triangulation, Prim handles them
+        missing = np.setdiff1d(np.arange(self.num_nodes), edges)
+        if missing.size:
+            return None
+
+        return self.Distance(u, v), u, v
+
+    def CalculateMST(self):
+        """
+        Entry Point function. Will return the order of points
+        :return:
+        """
+        dist, u, v = self.Edges()
+        points = self.points.astype(int)
+        return np.hstack((points[u], points[v])).tolist()
 
-        return connected_points
 
 """
 
@@ -91,66 +181,97 @@ TEST CASE
 
 """
 if __name__ == '__main__':
-    if test_case:
-        import random
-        import matplotlib.pyplot as plt
-        import numpy as np
-        from scipy.spatial import distance
-        from scipy.sparse.csgraph import minimum_spanning_tree
-
-        num_nodes = 10  # Number of random nodes
-        num_clusters = np.random.randint(2, 5)
-        cluster_centre = np.random.uniform(100, 200, (num_clusters, 2))
-        max_distance = 40
-        min_distance = 20
-
-        # Generate clustered random nodes
-        nodes = []
-        for _ in range(num_nodes):
-            while True:
-                if np.random.rand() > 0.5:
-                    x = np.random.normal(150, max_distance)
-                    y = np.random.normal(150, max_distance)
-                else:
-                    curr_cluster_idx = np.random.choice(num_clusters)
-                    curr_cluster = cluster_centre[curr_cluster_idx]
-                    x = np.random.normal(curr_cluster[0], max_distance)
-                    y = np.random.normal(curr_cluster[1], max_distance)
-
-                x = np.clip(x, 100, 200)
-                y = np.clip(y, 100, 200)
-
-                if len(nodes) == 0 or np.all(np.linalg.norm(np.array(nodes) - np.array([x, y]), axis=1) >= min_distance):
-                    nodes.append([x, y])
-                    break
+    # python -m Model.MST: checks every method against scipy and times them up to thousands of nodes
+    import math
+    import time
 
-        nodes = np.array(nodes)
+    from scipy.spatial import distance
+    from scipy.sparse.csgraph import minimum_spanning_tree
 
-        mst_instance = MST(nodes)
-        my_mst = mst_instance.CalculateMST()
-
-        dist_mat = distance.cdist(nodes, nodes, 'euclidean')
-        scipy_mst_mat = minimum_spanning_tree(dist_mat).toarray().astype(bool)
-        scipy_mst = []
+    def LegacyMST(nodes):
+        # The double-loop implementation this module replaced, for the small-N comparison
+        edges = []
         for i in range(len(nodes)):
-            for j in range(i+1, len(nodes)):
-                if scipy_mst_mat[i, j]:
-                    scipy_mst.append([
-                        int(nodes[i][0]),  int(nodes[i][1]),
-                        int(nodes[j][0]), int(nodes[j][1])
-                    ])
+            for j in range(i + 1, len(nodes)):
+                edges.append((math.sqrt((nodes[i][0] - nodes[j][0]) ** 2 + (nodes[i][1] - nodes[j][1]) ** 2), i, j))
+        edges.sort()
+        parent = list(range(len(nodes)))
+
+        def find(i):
+            while parent[i] != i:
+                i = parent[i]
+            return i
+
+        tree = []
+        for dist, u, v in edges:
+            root_u, root_v = find(u), find(v)
+            if root_u != root_v:
+                tree.append([int(nodes[u][0]), int(nodes[u][1]), int(nodes[v][0]), int(nodes[v][1])])
+                parent[root_u] = root_v
+        return tree
+
+    def GameNodes(num_nodes, rng, low=100, high=200, min_distance=20, max_distance=40):
+        # Clustered nodes like Game4.GenerateNodes
+        cluster_centre = rng.uniform(low, high, (rng.integers(2, 5), 2))
+        nodes = []
+        while len(nodes) < num_nodes:
+            centre = np.full(2, (low + high) / 2) if rng.random() > 0.5 else cluster_centre[rng.integers(len(cluster_centre))]
+            point = np.clip(rng.normal(centre, max_distance), low, high)
+            if not nodes or np.all(np.linalg.norm(np.array(nodes) - point, axis=1) >= min_distance):
+                nodes.append(point)
+        return np.array(nodes)
+
+    def ScipyWeight(points):
+        return minimum_spanning_tree(distance.cdist(points, points)).sum()
+
+    rng = np.random.default_rng(0)
 
-        fig, axes = plt.subplots(1, 2, figsize=(12, 6))
-        axes[0].scatter(*zip(*nodes), color='blue')
-        for x1, y1, x2, y2 in my_mst:
-            axes[0].plot([x1, x2], [y1, y2], color='green')
+    # Game sized levels: identical output to the old implementation, including tie breaking
+    for trial in range(200):
+        nodes = GameNodes(int(rng.integers(2, 12)), rng)
+        assert MST(nodes).CalculateMST() == LegacyMST(nodes), trial
+    grid = np.array([[x, y] for x in range(0, 50, 10) for y in range(0, 50, 10)], dtype=float)
+    assert MST(grid).CalculateMST() == LegacyMST(grid), 'ties on a grid'
+    print('game levels: identical to the previous implementation (200 random levels + a grid full of ties)')
 
-        axes[0].set_title('MY MST')
+    # Every method against scipy: same total length, same edges when the lengths are distinct
+    for n in (2, 3, 10, 100, 500, 1500):
+        points = rng.uniform(0, 1000, (n, 2))
+        reference = ScipyWeight(points)
+        reference_edges = set(zip(*np.nonzero(minimum_spanning_tree(distance.cdist(points, points)).toarray())))
+        reference_edges = {(min(a, b), max(a, b)) for a, b in reference_edges}
+        for method in ('kruskal', 'prim', 'delaunay'):
+            if method == 'kruskal' and n > 500:
+                continue
+            dist, u, v = MST(points, method=method).Edges()
+            assert len(dist) == n - 1
+            assert np.isclose(dist.sum(), reference), (n, method)
+            assert set(zip(u.tolist(), v.tolist())) == reference_edges, (n, method)
+    print('kruskal, prim and delaunay match scipy.sparse.csgraph.minimum_spanning_tree')
 
-        axes[1].scatter(*zip(*nodes), color='blue')
-        for x1, y1, x2, y2 in scipy_mst:
-            axes[1].plot([x1, x2], [y1, y2], color='red')
-        axes[1].set_title('SCIPY MST')
+    # Degenerate inputs fall back cleanly
+    line = np.column_stack((np.arange(20.0), np.zeros(20)))
+    assert np.isclose(MST(line, method='delaunay').Edges()[0].sum(), 19)
+    # scipy reads zero distances as missing edges, so duplicates are checked against the unique points
+    unique = rng.uniform(0, 100, (10, 2))
+    assert np.isclose(MST(np.vstack((unique, unique)), method='delaunay').Edges()[0].sum(), ScipyWeight(unique))
+    assert MST(np.zeros((0, 2))).CalculateMST() == [] and MST([[1, 2]]).CalculateMST() == []
 
-        plt.show()
+    def Time(function, repeat=3):
+        best = np.inf
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+        return best * 1e3
 
+    print(f"{'N':>6} {'legacy':>10} {'kruskal':>10} {'prim':>10} {'delaunay':>10} {'auto':>10} {'scipy dense':>12}  (ms)")
+    for n in (10, 50, 200, 1000, 3000, 10000):
+        points = rng.uniform(0, 1000, (n, 2))
+        row = [Time(lambda: LegacyMST(points), 1) if n <= 1000 else np.nan,
+               Time(lambda: MST(points, method='kruskal').Edges(), 1) if n <= 1000 else np.nan,
+               Time(lambda: MST(points, method='prim').Edges(), 1) if n <= 3000 else np.nan,
+               Time(lambda: MST(points, method='delaunay').Edges()),
+               Time(lambda: MST(points).Edges()),
+               Time(lambda: ScipyWeight(points), 1) if n <= 3000 else np.nan]
+        print(f'{n:>6} ' + ' '.join(f'{t:>10.2f}' for t in row[:-1]) + f' {row[-1]:>12.2f}')
@@ -0,0 +1,344 @@
+"""
+Session files, one folder per recording:
+    meta.json           frame shape, chunk size, start time
+    frames_0000.npy     processed RGB frames, chunk_size per file, memory-mapped while writing and replaying
+    events.jsonl        one JSON object per line, in the order they were recorded:
+        {"type": "frame", "t": ..., "id": ..., "index": ...}          index = position in the frame chunks
+        {"type": "pos", "t": ..., "id": ..., "x": ..., "y": ..., "conf": ...}
+        {"type": "currents", "t": ..., "I": [I1, I2, I3, I4]}
+Timestamps are time.monotonic() seconds.
+"""
+import cv2
+import numpy as np
+
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+SESSION_VERSION = 1
+
+
+class SessionRecorder:
+    """
+    Streams camera frames, tracked positions and coil setpoints into a session folder.
+    The Record* calls only enqueue, a background thread does all file IO. When the
+    writer falls behind, frames are dropped (and counted) instead of blocking the caller.
+    """
+    def __init__(self, chunk_size: int = 64, max_pending: int = 32):
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending  # frames waiting for the writer
+
+        self.path = None
+        self.queue = None
+        self.thread = None
+        self.active = False
+
+        self.frames = 0
+        self.dropped = 0
+        self.pending_frames = 0
+        self.lock = threading.Lock()
+
+    def Start(self, path: str = None, folder: str = 'sessions') -> str:
+        """
+        :param path: session folder, defaults to a timestamped folder in folder
+        :return: the session folder
+        """
+        if self.active:
+            self.Stop()
+
+        if path is None:
+            path = os.path.join(folder, datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+        os.makedirs(path, exist_ok=True)
+
+        self.path = path
+        self.queue = queue.Queue()
+        self.frames = 0
+        self.dropped = 0
+        self.pending_frames = 0
+
+        self.thread = threading.Thread(target=self.run, args=(path, self.queue), daemon=True)
+        self.thread.start()
+        self.active = True
+        return path
+
+    def Stop(self) -> None:
+        """Writes everything still queued, then closes the session"""
+        if not self.active:
+            return
+        self.active = False
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+    def RecordFrame(self, frame: np.ndarray, timestamp: float, frame_id: int) -> bool:
+        """
+        Called by the camera thread. The frame must not be modified afterwards
+        :return: False if the frame was dropped
+        """
+        if not self.active:
+            return False
+        with self.lock:
+            if self.pending_frames >= self.max_pending:
+                self.dropped += 1
+                return False
+            self.pending_frames += 1
+        self.queue.put(('frame', timestamp, frame_id, frame))
+        return True
+
+    def RecordPosition(self, timestamp: float, pos, frame_id: int, confidence: float) -> None:
+        if self.active:
+            self.queue.put(('pos', timestamp, frame_id, (float(pos[0]), float(pos[1]), float(confidence))))
+
+    def RecordCurrents(self, currents, timestamp: float = None) -> None:
+        if self.active:
+            timestamp = time.monotonic() if timestamp is None else timestamp
+            self.queue.put(('currents', timestamp, None, [round(float(I), 4) for I in np.asarray(currents).flatten()]))
+
+    def run(self, path: str, items: queue.Queue):
+        chunk = None
+        index = 0
+        meta_written = False
+
+        with open(os.path.join(path, 'events.jsonl'), 'w') as events:
+            while True:
+                item = items.get()
+                if item is None:
+                    break
+                kind, timestamp, frame_id, data = item
+
+                if kind == 'frame':
+                    if not meta_written:
+                        self.WriteMeta(path, data.shape, timestamp)
+                        meta_written = True
+                    if index % self.chunk_size == 0:
+                        if chunk is not None:
+                            chunk.flush()
+                        chunk = np.lib.format.open_memmap(ChunkPath(path, index // self.chunk_size), mode='w+',
+                                                          dtype=np.uint8, shape=(self.chunk_size,) + data.shape)
+                    chunk[index % self.chunk_size] = data
+                    event = {'type': 'frame', 't': timestamp, 'id': frame_id, 'index': index}
+                    index += 1
+                    with self.lock:
+                        self.pending_frames -= 1
+                        self.frames = index
+
+                elif kind == 'pos':
+                    x, y, confidence = data
+                    event = {'type': 'pos', 't': timestamp, 'id': frame_id, 'x': x, 'y': y, 'conf': confidence}
+
+                else:
+                    event = {'type': 'currents', 't': timestamp, 'I': data}
+
+                events.write(json.dumps(event) + '\n')
+
+        if chunk is not None:
+            chunk.flush()
+            del chunk
+
+    def WriteMeta(self, path: str, shape: tuple, start: float) -> None:
+        meta = {'version': SESSION_VERSION, 'frame_shape': list(shape), 'chunk_size': self.chunk_size,
+                'start': start, 'created': datetime.now().isoformat()}
+        with open(os.path.join(path, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+
+
+def ChunkPath(path: str, chunk: int) -> str:
+    return os.path.join(path, f'frames_{chunk:04d}.npy')
+
+
+class Session:
+    """
+    Read side of a session folder. Frames stay memory-mapped, events are split into arrays:
+        frame_times (N,), frame_ids (N,)
+        positions (M, 5) rows [t, x, y, frame_id, confidence], same layout as PositionBuffer
+        currents (K, 5) rows [t, I1, I2, I3, I4]
+    """
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as file:
+            self.meta = json.load(file)
+        self.chunk_size = self.meta['chunk_size']
+
+        frames, positions, currents = [], [], []
+        with open(os.path.join(path, 'events.jsonl'), 'r') as file:
+            for line in file:
+                event = json.loads(line)
+                if event['type'] == 'frame':
+                    frames.append((event['t'], event['id']))
+                elif event['type'] == 'pos':
+                    positions.append((event['t'], event['x'], event['y'], event['id'], event['conf']))
+                elif event['type'] == 'currents':
+                    currents.append([event['t']] + event['I'])
+
+        frames = np.array(frames).reshape(-1, 2)
+        self.frame_times = frames[:, 0]
+        self.frame_ids = frames[:, 1].astype(int)
+        self.positions = np.array(positions).reshape(-1, 5)
+        self.currents = np.array(currents).reshape(-1, 5)
+
+        self.chunks = {}
+
+    def __len__(self):
+        return len(self.frame_times)
+
+    def Frame(self, index: int) -> np.ndarray:
+        """
+        :return: read-only view of the processed RGB frame
+        """
+        chunk = index // self.chunk_size
+        if chunk not in self.chunks:
+            self.chunks[chunk] = np.load(ChunkPath(self.path, chunk), mmap_mode='r')
+        return self.chunks[chunk][index % self.chunk_size]
+
+    def CurrentsAt(self, timestamp: float) -> np.ndarray:
+        """
+        :return: the last setpoint sent at or before timestamp, zeros before the first one
+        """
+        i = np.searchsorted(self.currents[:, 0], timestamp, side='right') - 1
+        return self.currents[i, 1:] if i >= 0 else np.zeros(4)
+
+
+class ReplayCamera:
+    """
+    Camera backend that plays a recorded session back through CameraThread.
+    Frames are turned back into the camera's BGR orientation so the normal
+    processing reproduces the recorded frame exactly.
+    realtime=True keeps the recorded frame timing, loop=True starts over at the end.
+    """
+    def __init__(self, path: str, realtime: bool = True, loop: bool = True):
+        self.session = Session(path)
+        if len(self.session) == 0:
+            raise ValueError(f'No frames recorded in {path}')
+        self.realtime = realtime
+        self.loop = loop
+
+        self.index = 0
+        self.start_time = None
+        self.setpoint = np.zeros(4)  # recorded coil currents at the frame being replayed
+
+    def Capture(self) -> np.ndarray:
+        if self.index >= len(self.session):
+            if not self.loop:
+                time.sleep(0.1)
+                return None
+            self.index = 0
+            self.start_time = None
+
+        offset = self.session.frame_times[self.index] - self.session.frame_times[0]
+        now = time.monotonic()
+        if self.start_time is None:
+            self.start_time = now
+        elif self.realtime:
+            wait = self.start_time + offset - now
+            if wait > 0:
+                time.sleep(wait)
+
+        timestamp = self.session.frame_times[self.index]
+        self.setpoint = self.session.CurrentsAt(timestamp)
+        frame = self.session.Frame(self.index)
+        self.index += 1
+
+        # Inverse of ImageProcessing.OutputProcessedCameraFrame
+        return cv2.rotate(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR), cv2.ROTATE_90_CLOCKWISE)
+
+    def Close(self) -> None:
+        self.session.chunks.clear()
+
+
+_recorder = SessionRecorder()
+
+
+def GetRecorder() -> SessionRecorder:
+    """
+    Returns the process-wide recorder the camera thread and the serial worker write to.
+    It records nothing until Start() is called
+    :return:
+    """
+    return _recorder
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Record a synthetic session, then replay it through the tracker and compare
+    import shutil
+    import tempfile
+
+    from Model.Camera import ImageProcessing
+    from Model.Simulator import SyntheticCamera, CoilSimulator
+    from Model.Tracker import RobotTracker
+
+    processing = ImageProcessing()
+    camera = SyntheticCamera(simulator=CoilSimulator())
+    n = 300
+
+    frames = []
+    for t in np.linspace(0, 2 * np.pi, n):
+        pos = np.array([350 + 120 * np.cos(t), 350 + 120 * np.sin(t)])
+        frames.append(processing.OutputProcessedCameraFrame(camera.Render(pos)))
+    timestamps = np.arange(n) / 30.0
+
+    folder = tempfile.mkdtemp()
+    try:
+        recorder = SessionRecorder(max_pending=n)  # no drops, so the replay can be compared frame by frame
+        recorder.Start(os.path.join(folder, 'session'))
+        tracker = RobotTracker()
+
+        record_time = 0.0
+        for i, (frame, t) in enumerate(zip(frames, timestamps)):
+            pos, confidence = tracker.Track(frame, t)
+            start = time.perf_counter()
+            recorder.RecordFrame(frame, t, i)
+            recorder.RecordPosition(t, pos, i, confidence)
+            if i % 3 == 0:
+                recorder.RecordCurrents(np.sin(t + np.arange(4)), t)
+            record_time += time.perf_counter() - start
+            time.sleep(1 / 300)  # the real camera thread has the tracker and capture in between
+
+        start = time.perf_counter()
+        recorder.Stop()
+        drain_time = time.perf_counter() - start
+        print(f'{n} frames: {recorder.frames} written, {recorder.dropped} dropped, '
+              f'{record_time / n * 1e6:.1f} us per frame on the caller, {drain_time * 1e3:.1f} ms to drain on Stop')
+
+        # Replay: same frames, same tracker output
+        replay = ReplayCamera(os.path.join(folder, 'session'), realtime=False, loop=False)
+        session = replay.session
+        tracker.Reset()
+        replayed = []
+        for i in range(len(session)):
+            frame = processing.OutputProcessedCameraFrame(replay.Capture())
+            assert np.array_equal(frame, frames[session.frame_ids[i]])
+            pos, confidence = tracker.Track(frame, session.frame_times[i])
+            replayed.append(pos)
+
+        recorded = session.positions[:, 1:3]
+        assert np.array_equal(np.array(replayed), recorded), 'replayed positions differ from the recording'
+        assert np.allclose(session.CurrentsAt(timestamps[4]), np.round(np.sin(timestamps[3] + np.arange(4)), 4))
+
+        # A coil reset shows up as zeros in the session, even when nothing is connected
+        from Model.Recorder import GetRecorder  # the singleton SerialCom records into, not this __main__ copy
+        from Model.SerialCom import ArduinoController
+
+        GetRecorder().Start(os.path.join(folder, 'reset'))
+        GetRecorder().RecordFrame(frames[0], time.monotonic(), 0)
+        GetRecorder().RecordCurrents(np.ones(4))
+        time.sleep(0.01)
+        ArduinoController().reset()
+        reset_time = time.monotonic()
+        GetRecorder().Stop()
+        reset_session = Session(os.path.join(folder, 'reset'))
+        assert len(reset_session.currents) == 2 and np.all(reset_session.currents[0, 1:] == 1)
+        assert np.array_equal(reset_session.CurrentsAt(reset_time), np.zeros(4)), 'reset not recorded'
+        print('coil reset recorded as zero currents')
+
+        size = sum(os.path.getsize(os.path.join(folder, 'session', name)) for name in os.listdir(os.path.join(folder, 'session')))
+        print(f'replayed {len(session)} frames, tracked positions identical, session size {size / 1e6:.0f} MB')
+    finally:
+        shutil.rmtree(folder)
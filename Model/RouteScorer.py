@@ -0,0 +1,173 @@
+import numpy as np
+
+from Model.MST import MST
+
+
+class RouteScorer:
+    """
+    Keeps the Route Designer solution and the player's edges side by side.
+    The MST is solved once per node set. The player's edges live in a union-find
+    without path compression (union by size), so the last edge can be rolled back
+    exactly on undo. Every action is O(log n) and the live stats are O(1) to read.
+    """
+    def __init__(self):
+        self.key = None
+        self.SetNodes(np.zeros((0, 2)))
+
+    def SetNodes(self, nodes) -> None:
+        """
+        Solves the MST for a new node set, nothing to do if it's the same set
+        :param nodes: (N, 2)
+        """
+        nodes = np.asarray(nodes, dtype=float).reshape(-1, 2)
+        key = nodes.tobytes()
+        if key != self.key:
+            self.key = key
+            self.nodes = nodes
+            solver = MST(nodes)
+            dist, u, v = solver.Edges()
+            points = nodes.astype(int)
+            self.solution = np.hstack((points[u], points[v])).tolist()  # MST.CalculateMST format
+            self.solution_edges = set(zip(u.tolist(), v.tolist()))
+            self.solution_length = float(np.sum(dist))
+        self.Reset()
+
+    def Reset(self) -> None:
+        n = len(self.nodes)
+        self.parent = list(range(n))
+        self.size = [1] * n
+        self.history = []  # (edge, total length before it, kind, merged root)
+        self.edge_count = {}
+        self.length = 0.0
+        self.edges = 0  # distinct edges
+        self.components = n
+        self.cycles = 0
+        self.correct = 0  # distinct edges that are in the solution
+
+    def _find(self, i):
+        while self.parent[i] != i:
+            i = self.parent[i]
+        return i
+
+    def Connect(self, i: int, j: int) -> str:
+        """
+        Adds the player's edge i-j
+        :return: 'tree', 'cycle' (closes a loop) or 'duplicate' (already drawn)
+        """
+        edge = (min(i, j), max(i, j))
+        length = float(np.linalg.norm(self.nodes[i] - self.nodes[j]))
+        merged = None
+        previous = self.length
+
+        if self.edge_count.get(edge, 0):
+            kind = 'duplicate'
+        else:
+            root_i, root_j = self._find(i), self._find(j)
+            if root_i == root_j:
+                kind = 'cycle'
+                self.cycles += 1
+            else:
+                kind = 'tree'
+                if self.size[root_i] < self.size[root_j]:
+                    root_i, root_j = root_j, root_i
+                self.parent[root_j] = root_i
+                self.size[root_i] += self.size[root_j]
+                self.components -= 1
+                merged = root_j
+            self.length += length
+            self.edges += 1
+            self.correct += edge in self.solution_edges
+
+        self.edge_count[edge] = self.edge_count.get(edge, 0) + 1
+        self.history.append((edge, previous, kind, merged))
+        return kind
+
+    def Undo(self) -> None:
+        """
+        Rolls back the last Connect
+        """
+        if not self.history:
+            return
+        edge, previous, kind, merged = self.history.pop()
+        self.edge_count[edge] -= 1
+        if kind == 'duplicate':
+            return
+
+        if kind == 'cycle':
+            self.cycles -= 1
+        else:
+            root = self.parent[merged]
+            self.parent[merged] = merged
+            self.size[root] -= self.size[merged]
+            self.components += 1
+        self.length = previous  # restored, not subtracted, so no rounding builds up
+        self.edges -= 1
+        self.correct -= edge in self.solution_edges
+
+    def EdgesRemaining(self) -> int:
+        # Edges still needed to join every node
+        return max(self.components - 1, 0)
+
+    def IsSolved(self) -> bool:
+        return len(self.nodes) > 1 and self.correct == len(self.nodes) - 1 and self.edges == self.correct
+
+    def Score(self, k: float = 0.001) -> float:
+        """
+        Length of the drawn edges against the solution's, minus k per edge too many or too few
+        :param k: edge count penalty
+        :return: 0 to 1
+        """
+        if self.solution_length == 0 or self.edges == 0:
+            return 0.0
+        Lu, Li = self.length, self.solution_length
+        Eu, Ei = self.edges, len(self.nodes) - 1
+        error = abs(Lu - Li) / Li
+        if error < 1e-9:
+            error = 0.0  # same edges summed in a different order
+        return max(0.0, 1 - error - k * abs(Eu - Ei))
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Cost of a scoring action against re-solving the MST on every Check press, and undo round trips
+    import timeit
+
+    rng = np.random.default_rng(0)
+    for n in (9, 100, 1000):
+        nodes = rng.uniform(0, 1000, (n, 2))
+        scorer = RouteScorer()
+        scorer.SetNodes(nodes)
+
+        # Solution edges in a shuffled order plus a few wrong ones
+        dist, u, v = MST(nodes).Edges()
+        pairs = list(zip(u.tolist(), v.tolist()))
+        rng.shuffle(pairs)
+        wrong = [tuple(rng.choice(n, 2, replace=False).tolist()) for _ in range(max(n // 10, 2))]
+
+        for i, j in pairs:
+            assert scorer.Connect(i, j) == 'tree'
+        assert scorer.IsSolved() and scorer.EdgesRemaining() == 0 and np.isclose(scorer.Score(), 1)
+
+        state = (scorer.length, scorer.edges, scorer.components, scorer.cycles, scorer.correct, list(scorer.parent))
+        kinds = [scorer.Connect(i, j) for i, j in wrong]
+        assert all(kind in ('cycle', 'duplicate') for kind in kinds) and not scorer.IsSolved()
+        for _ in wrong:
+            scorer.Undo()
+        assert state == (scorer.length, scorer.edges, scorer.components, scorer.cycles, scorer.correct, scorer.parent)
+
+        for _ in pairs:
+            scorer.Undo()
+        assert scorer.components == n and scorer.edges == 0
+
+        def Action():
+            scorer.Connect(*pairs[0])
+            scorer.Score(), scorer.EdgesRemaining()
+            scorer.Undo()
+
+        t_action = min(timeit.repeat(Action, number=1000, repeat=5)) / 1000
+        t_resolve = min(timeit.repeat(lambda: MST(nodes).CalculateMST(), number=1, repeat=3))
+        print(f'{n:>5} nodes: connect + score + undo {t_action * 1e6:.1f} us, MST re-solve {t_resolve * 1e3:.2f} ms')
@@ -0,0 +1,313 @@
+import numpy as np
+
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+# Upper edges of the jitter histogram bins in ms, the last bin takes everything later
+JITTER_BINS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0)
+
+
+class Stage:
+    """
+    One periodic job of the scheduler. Thread stages run on the scheduler thread and must
+    not touch widgets, gui stages are posted to the GUI thread with the same deadlines.
+    """
+    def __init__(self, name: str, callback, rate: float, gui: bool, start: float):
+        self.name = name
+        self.callback = callback
+        self.period = 1.0 / rate
+        self.gui = gui
+        self.deadline = start
+        self.active = True
+        self.pending = False  # gui stage posted but not run yet
+
+        self.ResetStats()
+
+    def ResetStats(self):
+        self.runs = 0
+        self.overruns = 0
+        self.busy = 0.0  # total callback time, s
+        self.busy_max = 0.0
+        self.lateness = []
+        self.histogram = np.zeros(len(JITTER_BINS) + 1, dtype=int)
+
+    def Record(self, lateness: float, duration: float) -> None:
+        self.runs += 1
+        self.busy += duration
+        self.busy_max = max(self.busy_max, duration)
+        self.lateness.append(lateness)
+        self.histogram[np.searchsorted(JITTER_BINS, lateness * 1e3)] += 1
+
+    def Stats(self, elapsed: float) -> dict:
+        lateness = np.array(self.lateness) * 1e3 if self.lateness else np.zeros(1)
+        return {'rate': self.runs / elapsed,
+                'busy_mean': self.busy / self.runs * 1e3 if self.runs else 0.0,
+                'busy_max': self.busy_max * 1e3,
+                'jitter_mean': float(np.mean(lateness)),
+                'jitter_p99': float(np.percentile(lateness, 99)),
+                'jitter_max': float(np.max(lateness)),
+                'overruns': self.overruns,
+                'histogram': self.histogram.tolist()}
+
+
+class ControlScheduler(QThread):
+    """
+    Runs every periodic control job of the app (input sampling, control, sending,
+    game logic) from one thread against time.monotonic() deadlines, so the cadence
+    does not drift with the callbacks' run time. A stage that falls a whole period
+    behind skips ahead and counts an overrun instead of bursting.
+    One-shot calls (CallAt/CallLater) fire at their own deadline, independent of the stage rates.
+    Per-stage jitter (how late each run started) and busy time are published once a second.
+    """
+    dispatch = pyqtSignal(object, float)  # gui stage or call, deadline
+    stats_updated = pyqtSignal(dict)  # stage name -> Stage.Stats()
+
+    def __init__(self, rate: float = None):
+        """
+        :param rate: default stage rate in Hz, EDUMAG_CONTROL_RATE or 100
+        """
+        super().__init__()
+        self.rate = rate if rate is not None else float(os.environ.get('EDUMAG_CONTROL_RATE', 100))
+        self.condition = threading.Condition()
+        self.stages = []
+        self.calls = []  # heap of (deadline, seq, call)
+        self.seq = itertools.count()
+        self.running = False
+        self.stats_time = time.monotonic()
+
+        self.dispatch.connect(self.RunGui)
+
+    def AddStage(self, name: str, callback, rate: float = None, gui: bool = False) -> Stage:
+        """
+        :param callback: called with no arguments every 1/rate s
+        :param rate: Hz, defaults to the scheduler rate
+        :param gui: run on the GUI thread (anything that touches widgets)
+        """
+        stage = Stage(name, callback, rate if rate is not None else self.rate, gui, time.monotonic())
+        with self.condition:
+            self.stages.append(stage)
+            self.condition.notify()
+        return stage
+
+    def RemoveStage(self, stage: Stage) -> None:
+        if stage is None:
+            return
+        with self.condition:
+            stage.active = False
+            if stage in self.stages:
+                self.stages.remove(stage)
+
+    def CallAt(self, deadline: float, callback, gui: bool = False) -> Stage:
+        """
+        One-shot call at a time.monotonic() deadline
+        :return: handle for Cancel
+        """
+        call = Stage('call', callback, 1.0, gui, deadline)
+        with self.condition:
+            heapq.heappush(self.calls, (deadline, next(self.seq), call))
+            self.condition.notify()
+        return call
+
+    def CallLater(self, delay: float, callback, gui: bool = False) -> Stage:
+        return self.CallAt(time.monotonic() + delay, callback, gui)
+
+    def Cancel(self, call: Stage) -> None:
+        if call is not None:
+            call.active = False  # dropped when its deadline comes up
+
+    def start(self, **kwargs):
+        # CPU-bound Python on other threads holds the GIL for a whole switch interval (5 ms by default),
+        # which would show up directly as stage jitter
+        sys.setswitchinterval(min(sys.getswitchinterval(), 0.001))
+        self.running = True
+        super().start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running:
+                    now = time.monotonic()
+                    deadlines = [stage.deadline for stage in self.stages]
+                    if self.calls:
+                        deadlines.append(self.calls[0][0])
+                    wait = min(deadlines) - now if deadlines else None
+                    if wait is not None and wait <= 0:
+                        break
+                    self.condition.wait(wait)
+                if not self.running:
+                    break
+
+                now = time.monotonic()
+                due_calls = []
+                while self.calls and self.calls[0][0] <= now:
+                    due_calls.append(heapq.heappop(self.calls)[2])
+                due_stages = [stage for stage in self.stages if stage.deadline <= now]
+
+            for call in due_calls:
+                if call.active:
+                    self.Run(call, now)
+
+            for stage in due_stages:
+                if not stage.active:
+                    continue
+                deadline = stage.deadline
+                stage.deadline += stage.period
+                late = stage.gui and stage.pending  # the GUI has not run the last one yet, don't queue another
+                if not late:
+                    self.Run(stage, deadline)
+                if time.monotonic() > stage.deadline:
+                    late = True
+                    stage.deadline = time.monotonic() + stage.period
+                if late:
+                    stage.overruns += 1  # once per tick, however it was late
+
+            self.UpdateStats()
+
+    def Run(self, stage: Stage, deadline: float) -> None:
+        if stage.gui:
+            stage.pending = True
+            self.dispatch.emit(stage, deadline)
+            return
+        start = time.monotonic()
+        try:
+            stage.callback()
+        except Exception as e:
+            print(f'Error in {stage.name}: {e}')
+        stage.Record(start - deadline, time.monotonic() - start)
+
+    def RunGui(self, stage: Stage, deadline: float) -> None:
+        stage.pending = False
+        if not stage.active:
+            return
+        start = time.monotonic()
+        try:
+            stage.callback()
+        except Exception as e:
+            print(f'Error in {stage.name}: {e}')
+        stage.Record(start - deadline, time.monotonic() - start)
+
+    def UpdateStats(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.stats_time
+        if elapsed >= 1.0:
+            with self.condition:
+                stages = list(self.stages)
+            stats = {}
+            for stage in stages:
+                stats[stage.name] = stage.Stats(elapsed)
+                stage.ResetStats()
+            self.stats_time = now
+            if stats:
+                self.stats_updated.emit(stats)
+
+
+def FormatStageStats(stats: dict) -> str:
+    return (f"{stats['rate']:.0f} Hz, jitter mean {stats['jitter_mean']:.2f} ms, p99 {stats['jitter_p99']:.2f} ms, "
+            f"busy {stats['busy_mean']:.2f} ms, overruns {stats['overruns']}")
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def GetScheduler() -> ControlScheduler:
+    """
+    Returns the process-wide scheduler, starting it on first use.
+    Must be called from the GUI thread the first time, gui stages are posted to it
+    :return:
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ControlScheduler()
+            _scheduler.start()
+    return _scheduler
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Jitter of a thread stage, a gui stage and one-shot calls, against QTimer at the same rates
+    from PyQt5.QtCore import QCoreApplication, QTimer
+
+    app = QCoreApplication(sys.argv)
+    duration = 3.0
+
+    def Busy(ms):
+        end = time.perf_counter() + ms / 1000
+        while time.perf_counter() < end:
+            pass
+
+    # QTimer: lateness of each timeout against an ideal 10 ms / 30 ms grid
+    timer_lateness = {10: [], 30: []}
+    timers = []
+    start = time.monotonic()
+    for period in timer_lateness:
+        timer = QTimer()
+        ticks = itertools.count(1)
+        timer.timeout.connect(lambda p=period, t=ticks: (timer_lateness[p].append(
+            time.monotonic() - start - next(t) * p / 1000), Busy(1)))
+        timer.start(period)
+        timers.append(timer)
+    QTimer.singleShot(int(duration * 1000), app.quit)
+    app.exec_()
+    for timer in timers:
+        timer.stop()
+
+    # Scheduler
+    scheduler = GetScheduler()
+    collected = []
+    scheduler.stats_updated.connect(collected.append)
+    control = scheduler.AddStage('control', lambda: Busy(1), 100)
+    game = scheduler.AddStage('game logic', lambda: Busy(1), 1000 / 30, gui=True)
+
+    shots = []
+
+    def Shot(deadline):
+        shots.append(time.monotonic() - deadline)
+        if len(shots) < 50:
+            next_deadline = deadline + 0.0437  # sub-second steps like a Game2 sequence
+            scheduler.CallAt(next_deadline, lambda: Shot(next_deadline))
+
+    first = time.monotonic() + 0.05
+    scheduler.CallAt(first, lambda: Shot(first))
+    QTimer.singleShot(int(duration * 1000) + 500, app.quit)
+    app.exec_()
+    scheduler.RemoveStage(control)
+    scheduler.RemoveStage(game)
+    scheduler.stop()
+
+    def Summary(lateness_ms):
+        lateness_ms = np.asarray(lateness_ms)
+        return f'mean {np.mean(lateness_ms):.2f} ms, p99 {np.percentile(lateness_ms, 99):.2f} ms, max {np.max(lateness_ms):.2f} ms'
+
+    # QTimer drift shows up as lateness growing over the run
+    for period, lateness in timer_lateness.items():
+        lateness = np.array(lateness) * 1e3
+        print(f'QTimer {period} ms: {len(lateness)} ticks of {int(duration * 1000 / period)}, drift '
+              f'{lateness[-1] - lateness[0]:.1f} ms, {Summary(np.abs(lateness))}')
+
+    for name in ('control', 'game logic'):
+        runs = [stats[name] for stats in collected if name in stats]
+        histogram = np.sum([stats['histogram'] for stats in runs], axis=0)
+        print(f"scheduler {name}: {np.mean([s['rate'] for s in runs]):.1f} Hz, "
+              f"p99 {np.max([s['jitter_p99'] for s in runs]):.2f} ms, max {np.max([s['jitter_max'] for s in runs]):.2f} ms, "
+              f"overruns {sum(s['overruns'] for s in runs)}")
+        print('    histogram (ms): ' + ', '.join(f'<{edge}: {count}' for edge, count in zip(JITTER_BINS, histogram))
+              + f', later: {histogram[-1]}')
+    print(f'one-shot calls: {len(shots)}, {Summary(np.array(shots) * 1e3)}')
@@ -2,6 +2,20 @@ import serial
 from serial.tools import list_ports
 import numpy as np
 import time
+
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from Model.SerialProtocol import ResponseParser, EncodeCurrents, BINARY_PROTOCOL, ACK
+from Model.Recorder import GetRecorder
+
+
+SIMULATOR_PORT = 'sim'
+
+
 class ArduinoController:
     def __init__(self):
         self.ser = None
@@ -9,11 +23,17 @@ class ArduinoController:
         self.baudrate = 115200
         self.timeout = 0.03
         self.attempts = 1  # Default max attempts for command echo check
+        self.framed = True  # Stop reading once the response is complete (see SerialProtocol)
+        self.terminator = None  # Optional line the firmware ends every response with
+        self.prefer_binary = True  # Try to negotiate binary setpoints on connect
+        self.binary = False
+        self.seq = 0
 
 
     def get_serial_ports_list(self):
         ports = list_ports.comports()  # Get list of available ports
         available_ports = [port.device for port in ports]
+        available_ports.append(SIMULATOR_PORT)  # software coil driver, see Model/Simulator.py
         print(f"Available serial ports: {available_ports}")
         return available_ports
 
@@ -33,18 +53,40 @@ class ArduinoController:
         """Set the number of attempts for command echo verification."""
         self.attempts = attempts
 
+    def set_prefer_binary(self, prefer_binary):
+        """Negotiate the binary setpoint protocol on the next connect, ASCII stays the fallback."""
+        self.prefer_binary = prefer_binary
+
+    def set_framed(self, framed, terminator=None):
+        """Enable terminator-aware response parsing, or fall back to reading until timeout."""
+        self.framed = framed
+        self.terminator = terminator
+
     def connect(self):
         """Establish a connection to the Arduino and return True if successful, False otherwise."""
+        port = self.port
+        if port == SIMULATOR_PORT:
+            from Model.Simulator import GetSimulator
+            port = GetSimulator().port
+
         try:
-            self.ser = serial.Serial(self.port, self.baudrate, timeout=self.timeout)
+            self.ser = serial.Serial(port, self.baudrate, timeout=self.timeout)
             #time.sleep(0.2)
-            return True
         except serial.SerialException:
             self.ser = None
             return False
 
+        self.binary = self.prefer_binary and self.negotiate_protocol()
+        return True
+
+    def negotiate_protocol(self):
+        """Return True if the firmware accepts binary setpoints. Older firmware doesn't echo the query."""
+        response = self.send_command_with_echo("GET PROTOCOL:")
+        return bool(response) and response.split('=')[-1].strip() == BINARY_PROTOCOL
+
     def disconnect(self):
         """Close the connection to the Arduino and return True if disconnected successfully, False otherwise."""
+        self.binary = False
         if self.ser and self.ser.is_open:
             self.ser.close()
             self.ser = None
@@ -56,14 +98,35 @@ class ArduinoController:
         if not self.ser or not self.ser.is_open:
             return False  # Not connected
 
+        if not self.framed:
+            return self.send_command_with_echo_legacy(command)
+
+        for attempt in range(self.attempts):
+            # Drop stale input so only this command's response gets parsed
+            self.ser.reset_input_buffer()
+            self.ser.write((command + '\n').encode())
+
+            # Returns as soon as the response is complete, readline only times out on a short response
+            parser = ResponseParser(command, self.terminator)
+            while not parser.complete:
+                line = self.ser.readline()
+                if not line:
+                    break
+                parser.Feed(line.decode().strip())
+
+            if parser.echoed:
+                return parser.Data()
+
+        return False  # Return False if echo check fails after max attempts
+
+    def send_command_with_echo_legacy(self, command):
+        """Original behaviour: read until the line times out after the echo."""
         for attempt in range(self.attempts):
             # Flush the input buffer to clear any stale data
             self.ser.reset_output_buffer()
 
             # Write the command to the serial port
             self.ser.write((command + '\n').encode())
-            
-            #time.sleep(0.1)  # Small delay after sending command to allow Arduino to process it
 
             # Read the echo response with a delay to wait for Arduino response
             response = self.ser.readline().decode().strip()
@@ -79,11 +142,7 @@ class ArduinoController:
             if attempt < self.attempts - 1:
                 self.ser.flushInput()
 
-                #time.sleep(3)  # Slightly longer delay between attempts for better syncing
-                pass
-
         return False  # Return False if echo check fails after max attempts
-        
 
     def set_percent_outputs(self, percent_outputs):
         command = "SET PERCENT OUTPUTS:" + ','.join(f"{output:.2f}" for output in percent_outputs)
@@ -94,12 +153,34 @@ class ArduinoController:
         response = self.send_command_with_echo(command)
         return np.array([float(value) for value in response.split('=')[1].strip().split(',')]) if response else False
 
-    def set_target_currents(self, target_currents):
+    def target_currents_command(self, target_currents):
         # Flatten to ensure a 1D array for formatting
-        target_currents = target_currents.flatten()
-        command = "SET TARGET CURRENTS:" + ','.join(f"{current:.2f}" for current in target_currents)
+        target_currents = np.asarray(target_currents).flatten()
+        return "SET TARGET CURRENTS:" + ','.join(f"{current:.2f}" for current in target_currents)
+
+    def set_target_currents(self, target_currents):
+        GetRecorder().RecordCurrents(target_currents)
+        if self.binary:
+            return self.send_binary_currents(target_currents)
+        command = self.target_currents_command(target_currents)
         return self.send_command_with_echo(command) is not False
 
+    def send_binary_currents(self, target_currents):
+        """Send one binary setpoint packet and wait for its one byte ack."""
+        if not self.ser or not self.ser.is_open:
+            return False
+
+        for attempt in range(self.attempts):
+            self.ser.reset_input_buffer()
+            self.ser.write(EncodeCurrents(target_currents, self.seq))
+            self.seq = (self.seq + 1) & 0xFF
+
+            ack = self.ser.read(1)
+            if ack and ack[0] == ACK:
+                return True
+
+        return False
+
     def get_target_currents(self):
         command = "GET TARGET CURRENTS:"
         response = self.send_command_with_echo(command)
@@ -111,14 +192,155 @@ class ArduinoController:
         return np.array([float(value) for value in response.split('=')[1].strip().split(',')]) if response else False
 
     def reset(self):
+        GetRecorder().RecordCurrents(np.zeros(4))  # the firmware drops every coil to zero
         command = "RESET:"
         return self.send_command_with_echo(command) is not False
 
 
+class SerialWorker(QThread):
+    """
+    Owns all UART traffic of an ArduinoController on its own thread.
+    Current setpoints are coalesced (only the newest pending one is sent),
+    other commands are queued in order and answered through futures and command_done.
+    """
+    command_done = pyqtSignal(str, object)  # command, response (False if the echo failed)
+
+    def __init__(self, controller: ArduinoController):
+        super().__init__()
+        self.controller = controller
+        self.condition = threading.Condition()
+        self.commands = deque()
+        self.pending_currents = None
+        self.running = False
+
+    def start(self, **kwargs):
+        self.running = True
+        super().start()
+
+    def SubmitCurrents(self, target_currents) -> None:
+        """Latest-wins: replaces any setpoint that has not been written yet"""
+        with self.condition:
+            self.pending_currents = np.asarray(target_currents, dtype=float).flatten()
+            self.condition.notify()
+
+    def Submit(self, command: str) -> Future:
+        future = Future()
+        with self.condition:
+            self.commands.append((command, future))
+            self.condition.notify()
+        return future
+
+    def Reset(self) -> Future:
+        # A setpoint still waiting would undo the reset, drop it
+        with self.condition:
+            self.pending_currents = None
+        return self.Submit("RESET:")
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.commands and self.pending_currents is None:
+                    self.condition.wait()
+
+                currents = None
+                if self.commands:
+                    command, future = self.commands.popleft()
+                elif self.pending_currents is not None:
+                    currents, future = self.pending_currents, None
+                    command = self.controller.target_currents_command(currents)
+                    self.pending_currents = None
+                else:
+                    break  # stopped and drained
+
+            try:
+                if currents is not None:
+                    response = self.controller.set_target_currents(currents)
+                else:
+                    response = self.controller.send_command_with_echo(command)
+            except (serial.SerialException, OSError) as e:
+                print(f"Error writing to serial: {e}")
+                response = False
+
+            if future is not None:
+                future.set_result(response)
+            self.command_done.emit(command, response)
+
+    def stop(self):
+        """Sends whatever is still queued, then ends the thread"""
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.wait()
+
 
 # Main code to test the functions
+# Loopback test against a pty fake Arduino: checks the responses and times a round trip
 if __name__ == "__main__":
-    arduino = ArduinoController()
+    from Model.Simulator import CoilSimulator
+
+    def RoundTrip(arduino, n=50):
+        start = time.perf_counter()
+        for i in range(n):
+            currents = np.array([i % 4, -1.5, 0.25, 3.0])
+            assert arduino.set_target_currents(currents)
+            assert np.allclose(arduino.get_target_currents(), currents)
+        return (time.perf_counter() - start) / (2 * n)
+
+    for framed, terminator in ((False, None), (True, None), (True, 'OK')):
+        simulator = CoilSimulator(terminator=terminator).start()
+
+        arduino = ArduinoController()
+        arduino.set_port(simulator.port)
+        arduino.set_framed(framed, terminator)
+        assert arduino.connect()
+
+        assert arduino.reset()
+        assert np.allclose(arduino.get_measured_currents(), 0)
+        latency = RoundTrip(arduino)
+
+        arduino.disconnect()
+        simulator.stop()
+
+        mode = 'legacy' if not framed else f'framed (terminator={terminator})'
+        print(f'{mode}: {latency * 1e3:.2f} ms per command')
+
+    # Binary setpoints: codec round trip, negotiation and throughput against the fake controller
+    from Model.SerialProtocol import EncodeCurrents, DecodeCurrents, PACKET_SIZE
+
+    currents = np.array([1.234, -3.999, 0.0, 2.5])
+    seq, decoded = DecodeCurrents(EncodeCurrents(currents, 257))
+    assert seq == 1 and np.allclose(decoded, currents)
+    corrupted = bytearray(EncodeCurrents(currents, 0))
+    corrupted[3] ^= 0xFF
+    try:
+        DecodeCurrents(bytes(corrupted))
+        raise AssertionError('CRC did not catch corruption')
+    except ValueError:
+        pass
+
+    ascii_size = len(ArduinoController().target_currents_command(currents)) + 1
+    for binary in (False, True):
+        simulator = CoilSimulator(binary=binary).start()
+
+        arduino = ArduinoController()
+        arduino.set_port(simulator.port)
+        assert arduino.connect()
+        assert arduino.binary == binary
+
+        n = 500
+        start = time.perf_counter()
+        for i in range(n):
+            assert arduino.set_target_currents(currents * (i % 2))
+        rate = n / (time.perf_counter() - start)
+        assert np.allclose(arduino.get_target_currents(), currents * ((n - 1) % 2), atol=0.01)
+
+        arduino.disconnect()
+        simulator.stop()
+
+        # At 115200 baud each byte costs 10 bits on the wire, both directions
+        wire = (PACKET_SIZE + 1) if binary else 2 * ascii_size
+        print(f"{'binary' if binary else 'ascii'}: {rate:.0f} setpoints/s over pty, "
+              f"{wire} bytes on the wire -> {11520 / wire:.0f} setpoints/s max at 115200 baud")
 
 
 
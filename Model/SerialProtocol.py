@@ -0,0 +1,105 @@
+"""
+Framing for the coil driver protocols.
+
+ASCII commands: every command is echoed back as one line. GET commands are followed by exactly
+one data line ("NAME = v1,v2,v3,v4"), the other commands by nothing. Firmware that
+ends each response with a terminator line (e.g. "OK") is supported as well, so a
+response is complete as soon as its last line arrives instead of after a timeout.
+
+Binary setpoints (optional, negotiated with "GET PROTOCOL:" -> "PROTOCOL = BIN1"):
+a fixed 12 byte packet, answered with a single ACK or NAK byte.
+    0xA5 | seq (u8) | I1..I4 (int16 mA, little endian) | CRC-16/CCITT-FALSE (u16)
+The sync byte is not printable so packets and ASCII lines can share the port.
+"""
+import binascii
+import struct
+
+import numpy as np
+
+BINARY_PROTOCOL = "BIN1"
+SYNC = 0xA5
+ACK = 0x06
+NAK = 0x15
+
+PACKET = struct.Struct('<BB4hH')
+PACKET_SIZE = PACKET.size
+
+# Number of lines after the echo, by command prefix
+RESPONSE_LINES = {
+    "GET": 1,
+    "SET": 0,
+    "RESET": 0,
+}
+
+
+def ExpectedLines(command: str) -> int:
+    return RESPONSE_LINES.get(command.split(' ', 1)[0].rstrip(':'), 0)
+
+
+class ResponseParser:
+    def __init__(self, command: str, terminator: str = None):
+        self.command = command
+        self.terminator = terminator
+        self.expected = ExpectedLines(command)
+
+        self.echoed = False
+        self.lines = []
+        self.complete = False
+
+    def Feed(self, line: str) -> bool:
+        """
+        Consumes one stripped line of the response
+        :param line:
+        :return: True once the response is complete
+        """
+        if not self.echoed:
+            # Anything before the echo is stale output of an earlier command
+            self.echoed = line == self.command
+            self.complete = self.echoed and self.expected == 0 and self.terminator is None
+            return self.complete
+
+        if self.terminator is not None:
+            if line == self.terminator:
+                self.complete = True
+            else:
+                self.lines.append(line)
+            return self.complete
+
+        self.lines.append(line)
+        self.complete = len(self.lines) >= self.expected
+        return self.complete
+
+    def Data(self) -> str:
+        return '\n'.join(self.lines)
+
+
+def Crc16(data: bytes) -> int:
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def EncodeCurrents(currents, seq: int) -> bytes:
+    """
+    Packs four currents in A into a binary setpoint packet
+    :param currents:
+    :param seq: sequence number, wraps at 256
+    :return:
+    """
+    milliamps = np.clip(np.round(np.asarray(currents, dtype=float).flatten() * 1000), -32768, 32767).astype(int)
+    body = PACKET.pack(SYNC, seq & 0xFF, *milliamps, 0)[:-2]
+    return body + struct.pack('<H', Crc16(body))
+
+
+def DecodeCurrents(packet: bytes):
+    """
+    Inverse of EncodeCurrents
+    :param packet:
+    :return: (seq, currents in A), raises ValueError on a bad sync byte, size or CRC
+    """
+    if len(packet) != PACKET_SIZE:
+        raise ValueError(f'Expected {PACKET_SIZE} bytes, got {len(packet)}')
+    sync, seq, i1, i2, i3, i4, crc = PACKET.unpack(packet)
+    if sync != SYNC:
+        raise ValueError(f'Bad sync byte {sync:#x}')
+    if crc != Crc16(packet[:-2]):
+        raise ValueError('CRC mismatch')
+    return seq, np.array([i1, i2, i3, i4]) / 1000
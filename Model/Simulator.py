@@ -0,0 +1,323 @@
+import cv2
+import numpy as np
+
+import os
+import select
+import threading
+import time
+import tty
+
+from Model.SerialProtocol import DecodeCurrents, BINARY_PROTOCOL, SYNC, ACK, NAK, PACKET_SIZE
+
+
+class CoilSimulator:
+    """
+    Software stand-in for the coil driver Arduino.
+    Opens a pty and answers the ASCII protocol of ArduinoController on it,
+    plus binary setpoints when binary=True. Connect an ArduinoController to .port to talk to it.
+    latency delays every reply (s), slew limits how fast measured currents follow the targets (A/s).
+    """
+    def __init__(self, terminator: str = None, binary: bool = False, latency: float = 0.0, slew: float = None):
+        self.terminator = terminator
+        self.binary = binary
+        self.latency = latency
+        self.slew = slew
+        self.last_seq = None
+
+        self.lock = threading.Lock()
+        self.target_currents = np.zeros(4)
+        self.measured_currents = np.zeros(4)
+        self.measured_time = time.monotonic()
+        self.percent_outputs = np.zeros(4)
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)  # no echo or newline translation by the line discipline
+        self.port = os.ttyname(self.slave)
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        os.close(self.master)
+        os.close(self.slave)
+
+    def run(self):
+        buffer = b''
+        while self.running:
+            ready, _, _ = select.select([self.master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                buffer += os.read(self.master, 1024)
+            except OSError:
+                break
+
+            while buffer:
+                if self.binary and buffer[0] == SYNC:
+                    if len(buffer) < PACKET_SIZE:
+                        break
+                    packet, buffer = buffer[:PACKET_SIZE], buffer[PACKET_SIZE:]
+                    self.Reply(bytes([self.HandlePacket(packet)]))
+
+                elif b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    reply = self.HandleCommand(line.decode(errors='replace').strip())
+                    if reply:
+                        self.Reply(reply.encode())
+
+                else:
+                    break
+
+    def Reply(self, data: bytes) -> None:
+        if self.latency > 0:
+            time.sleep(self.latency)
+        os.write(self.master, data)
+
+    def HandlePacket(self, packet: bytes) -> int:
+        """
+        Applies a binary setpoint packet
+        :param packet:
+        :return: ACK or NAK byte
+        """
+        try:
+            self.last_seq, currents = DecodeCurrents(packet)
+        except ValueError:
+            return NAK
+        self.SetTargetCurrents(currents)
+        return ACK
+
+    def HandleCommand(self, command: str) -> str:
+        """
+        Returns everything the firmware would print for one command line
+        :param command:
+        :return:
+        """
+        if not command:
+            return ''
+
+        name, _, args = command.partition(':')
+        lines = [command]
+
+        if name == 'SET TARGET CURRENTS':
+            self.SetTargetCurrents(self.ParseValues(args))
+        elif name == 'SET PERCENT OUTPUTS':
+            self.percent_outputs = self.ParseValues(args)
+        elif name == 'GET TARGET CURRENTS':
+            lines.append('TARGET CURRENTS = ' + self.FormatValues(self.target_currents))
+        elif name == 'GET MEASURED CURRENTS':
+            lines.append('MEASURED CURRENTS = ' + self.FormatValues(self.MeasuredCurrents()))
+        elif name == 'GET PERCENT OUTPUTS':
+            lines.append('PERCENT OUTPUTS = ' + self.FormatValues(self.percent_outputs))
+        elif name == 'GET PROTOCOL' and self.binary:
+            lines.append('PROTOCOL = ' + BINARY_PROTOCOL)
+        elif name == 'RESET':
+            self.SetTargetCurrents(np.zeros(4))
+            self.percent_outputs = np.zeros(4)
+        else:
+            return ''  # unknown commands are not echoed
+
+        if self.terminator is not None:
+            lines.append(self.terminator)
+        return ''.join(line + '\r\n' for line in lines)
+
+    def SetTargetCurrents(self, currents: np.ndarray) -> None:
+        with self.lock:
+            self.UpdateMeasured()
+            self.target_currents = np.asarray(currents, dtype=float)
+
+    def MeasuredCurrents(self) -> np.ndarray:
+        with self.lock:
+            self.UpdateMeasured()
+            return self.measured_currents.copy()
+
+    def UpdateMeasured(self) -> None:
+        """Moves the coil currents toward the targets, limited by the slew rate"""
+        now = time.monotonic()
+        if self.slew is None:
+            self.measured_currents = self.target_currents.copy()
+        else:
+            step = self.slew * (now - self.measured_time)
+            delta = np.clip(self.target_currents - self.measured_currents, -step, step)
+            self.measured_currents = self.measured_currents + delta
+        self.measured_time = now
+
+    def ParseValues(self, args: str) -> np.ndarray:
+        return np.array([float(value) for value in args.split(',')])
+
+    def FormatValues(self, values) -> str:
+        return ','.join(f'{value:.2f}' for value in values)
+
+
+class RobotModel:
+    """
+    Overdamped magnetic robot: moves along the force the coil currents produce at
+    the workspace centre, velocity = mobility * F. Positions are in processed frame
+    pixels (700x700, field +x to the right and +y up).
+    """
+    def __init__(self, mobility: float = 1000.0, size: int = 700, margin: int = 150):
+        from Model.EduMag import EduMag
+
+        solver = EduMag(use_lut=False)
+        self.B_vec = solver.B_vec
+        self.Grad_X = solver.Grad_X
+        self.Grad_Y = solver.Grad_Y
+
+        self.mobility = mobility
+        self.size = size
+        self.margin = margin
+        self.pos = np.array([size / 2, size / 2])
+
+    def Force(self, currents: np.ndarray) -> np.ndarray:
+        B = self.B_vec.dot(currents)
+        norm = np.linalg.norm(B)
+        if norm == 0:
+            return np.zeros(2)
+        unit = B / norm  # the robot's moment aligns with B
+        return np.array([unit.dot(self.Grad_X).dot(currents), unit.dot(self.Grad_Y).dot(currents)])
+
+    def Step(self, dt: float, currents: np.ndarray) -> np.ndarray:
+        Fx, Fy = self.Force(currents)
+        self.pos = self.pos + self.mobility * dt * np.array([Fx, -Fy])
+        self.pos = np.clip(self.pos, self.margin, self.size - self.margin)
+        return self.pos
+
+
+class SyntheticCamera:
+    """
+    Camera backend that renders the simulated robot as a dark blob on a bright
+    background. Frames match the Picamera2 output (1080x1080, BGR order) so they
+    go through the normal CameraThread pipeline.
+    """
+    def __init__(self, simulator: CoilSimulator = None, fps: float = 30.0, size: int = 1080,
+                 robot_radius: int = 12, noise: float = 4.0):
+        self.simulator = simulator if simulator is not None else GetSimulator()
+        self.period = 1.0 / fps
+        self.size = size
+        self.robot_radius = robot_radius
+        self.noise = noise
+
+        self.robot = RobotModel()
+
+        # A few pre-noised backgrounds, cycled so rendering stays cheap
+        rng = np.random.default_rng(0)
+        self.backgrounds = [np.full((size, size, 3), 200, dtype=np.uint8) for _ in range(4)]
+        if noise > 0:
+            for background in self.backgrounds:
+                background += rng.integers(0, int(noise), background.shape, dtype=np.uint8)
+        self.frame_count = 0
+        self.last_time = None
+
+    def Capture(self) -> np.ndarray:
+        now = time.monotonic()
+        if self.last_time is not None:
+            wait = self.period - (now - self.last_time)
+            if wait > 0:
+                time.sleep(wait)
+                now = time.monotonic()
+            self.robot.Step(now - self.last_time, self.simulator.MeasuredCurrents())
+        self.last_time = now
+
+        return self.Render(self.robot.pos)
+
+    def Render(self, pos: np.ndarray) -> np.ndarray:
+        frame = self.backgrounds[self.frame_count % len(self.backgrounds)].copy()
+        self.frame_count += 1
+
+        # Undo the 700x700 centre crop and 90 degree counterclockwise rotation of ImageProcessing
+        offset = self.size // 2 - self.robot.size // 2
+        x, y = pos
+        raw = (int(self.robot.size - 1 - y) + offset, int(x) + offset)
+        cv2.circle(frame, raw, self.robot_radius, (30, 30, 30), thickness=-1)
+        return frame
+
+    def Close(self) -> None:
+        pass
+
+
+_simulator = None
+_simulator_lock = threading.Lock()
+
+
+def GetSimulator() -> CoilSimulator:
+    """
+    Returns the process-wide simulator that the 'sim' serial port and the
+    synthetic camera share, starting it on first use
+    :return:
+    """
+    global _simulator
+    with _simulator_lock:
+        if _simulator is None:
+            latency = float(os.environ.get('EDUMAG_SIM_LATENCY', 0.0))
+            slew = os.environ.get('EDUMAG_SIM_SLEW')
+            _simulator = CoilSimulator(binary=True, latency=latency,
+                                       slew=float(slew) if slew else 20.0).start()
+    return _simulator
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Headless end-to-end latency: setpoint written on the 'sim' port -> robot seen moving by GetPos
+    from PyQt5.QtWidgets import QApplication
+    import sys
+
+    app = QApplication(sys.argv)
+
+    from Model.Camera import ImageProcessing
+    from Model.EduMag import EduMag
+    from Model.SerialCom import ArduinoController, SIMULATOR_PORT
+    from Model.Simulator import SyntheticCamera, GetSimulator  # the instance the 'sim' port uses
+
+    arduino = ArduinoController()
+    arduino.set_port(SIMULATOR_PORT)
+    assert arduino.connect() and arduino.binary
+
+    camera = SyntheticCamera(simulator=GetSimulator(), fps=60)
+    processing = ImageProcessing()
+    solver = EduMag()
+
+    def Locate():
+        return processing.GetPos(processing.OutputProcessedCameraFrame(camera.Capture()))
+
+    latencies = []
+    for theta in range(0, 360, 45):
+        arduino.reset()
+        while np.any(GetSimulator().MeasuredCurrents() != 0):  # let the coils slew down
+            time.sleep(0.01)
+        camera.robot.pos = np.array([350.0, 350.0])
+        camera.last_time = None
+        start_pos = Locate()
+        assert np.linalg.norm(start_pos - camera.robot.pos) < 2, (start_pos, camera.robot.pos)
+
+        start = time.perf_counter()
+        arduino.set_target_currents(solver.SetFieldForce(10, 200, theta))
+        for _ in range(120):
+            pos = Locate()
+            if np.linalg.norm(pos - start_pos) > 2:
+                break
+        latencies.append(time.perf_counter() - start)
+
+        # Per-coil slew bends the path at first, judge the direction further out
+        for _ in range(120):
+            pos = Locate()
+            if np.linalg.norm(pos - start_pos) > 30:
+                break
+
+        direction = np.degrees(np.arctan2(-(pos - start_pos)[1], (pos - start_pos)[0])) % 360
+        print(f'theta {theta:3d}: moved towards {direction:5.1f} deg after {latencies[-1] * 1e3:.1f} ms')
+
+    arduino.disconnect()
+    print(f'median setpoint-to-motion latency: {np.median(latencies) * 1e3:.1f} ms')
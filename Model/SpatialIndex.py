@@ -0,0 +1,128 @@
+import numpy as np
+
+import math
+
+
+class SpatialIndex:
+    """
+    Uniform grid hash over 2D points. With the cell size at least the query radius a
+    query only looks at the 3x3 cells around it, so hit-testing and minimum-distance
+    checks cost the same however many points there are.
+    """
+    def __init__(self, cell_size: float, points=None):
+        """
+        :param cell_size: pick the largest radius you'll query with
+        :param points: (N, 2) to start with
+        """
+        self.cell_size = float(cell_size)
+        self.cells = {}
+        self.points = []
+        if points is not None:
+            for point in np.asarray(points, dtype=float).reshape(-1, 2):
+                self.Insert(point)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell(self, x, y):
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def Insert(self, point) -> int:
+        """
+        :return: index of the point
+        """
+        x, y = float(point[0]), float(point[1])
+        index = len(self.points)
+        self.points.append((x, y))
+        self.cells.setdefault(self._cell(x, y), []).append(index)
+        return index
+
+    def Within(self, point, radius: float):
+        """
+        Indices of every point within radius, in insertion order
+        """
+        x, y = float(point[0]), float(point[1])
+        cx, cy = self._cell(x, y)
+        reach = max(1, int(math.ceil(radius / self.cell_size)))
+        r2 = radius * radius
+
+        found = []
+        for i in range(cx - reach, cx + reach + 1):
+            for j in range(cy - reach, cy + reach + 1):
+                for index in self.cells.get((i, j), ()):
+                    px, py = self.points[index]
+                    if (px - x) ** 2 + (py - y) ** 2 <= r2:
+                        found.append(index)
+        return sorted(found)
+
+    def Nearest(self, point, radius: float):
+        """
+        :return: index of the closest point within radius, None if there is none
+        """
+        x, y = float(point[0]), float(point[1])
+        best, best_d2 = None, radius * radius
+        for index in self.Within(point, radius):
+            px, py = self.points[index]
+            d2 = (px - x) ** 2 + (py - y) ** 2
+            if d2 <= best_d2:
+                best, best_d2 = index, d2
+        return best
+
+    def AnyWithin(self, point, radius: float) -> bool:
+        return len(self.Within(point, radius)) > 0
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Level generation and hit-testing with hundreds of nodes, grid hash against the per-node loops Game4 used
+    import timeit
+
+    rng = np.random.default_rng(0)
+
+    def SampleLoop(num_nodes, size, min_distance):
+        nodes = []
+        while len(nodes) < num_nodes:
+            point = rng.uniform(0, size, 2)
+            if len(nodes) == 0 or np.all(np.linalg.norm(np.array(nodes) - point, axis=1) >= min_distance):
+                nodes.append(point)
+        return np.array(nodes)
+
+    def SampleGrid(num_nodes, size, min_distance):
+        index = SpatialIndex(min_distance)
+        while len(index) < num_nodes:
+            point = rng.uniform(0, size, 2)
+            if not index.AnyWithin(point, min_distance):
+                index.Insert(point)
+        return np.array(index.points)
+
+    def HitLoop(nodes, pos, radius):
+        close_node = None
+        for node in nodes:
+            if np.linalg.norm(pos - node) <= radius:
+                close_node = node
+        return close_node
+
+    radius = 20
+    for num_nodes in (9, 100, 300, 800):
+        size = 40 * math.sqrt(num_nodes) * 2  # keeps the density a game level would have
+        nodes = SampleGrid(num_nodes, size, radius)
+        assert np.min([np.sort(np.linalg.norm(nodes - node, axis=1))[1] for node in nodes]) >= radius
+
+        index = SpatialIndex(radius, nodes)
+        probes = np.vstack((nodes[:50] + rng.uniform(-15, 15, (min(50, num_nodes), 2)), rng.uniform(0, size, (50, 2))))
+        for pos in probes:
+            expected = [i for i, node in enumerate(nodes) if np.linalg.norm(pos - node) <= radius]
+            assert index.Within(pos, radius) == expected
+            nearest = index.Nearest(pos, radius)
+            assert (nearest is None) == (HitLoop(nodes, pos, radius) is None)
+
+        t_gen_loop = min(timeit.repeat(lambda: SampleLoop(num_nodes, size, radius), number=1, repeat=3))
+        t_gen_grid = min(timeit.repeat(lambda: SampleGrid(num_nodes, size, radius), number=1, repeat=3))
+        t_hit_loop = min(timeit.repeat(lambda: [HitLoop(nodes, pos, radius) for pos in probes], number=1, repeat=3))
+        t_hit_grid = min(timeit.repeat(lambda: [index.Nearest(pos, radius) for pos in probes], number=1, repeat=3))
+        print(f'{num_nodes:>4} nodes: generate {t_gen_loop * 1e3:8.1f} ms loop / {t_gen_grid * 1e3:6.1f} ms grid, '
+              f'hit test {t_hit_loop / len(probes) * 1e6:8.1f} us loop / {t_hit_grid / len(probes) * 1e6:5.1f} us grid')
@@ -0,0 +1,253 @@
+import numpy as np
+
+
+class StrokeBuffer:
+    """
+    Growable (n, 5) [x, y, r, g, b] point list in the CameraHandler.drawn_line format.
+    Rows live in one preallocated array that doubles when full, so appends are amortized
+    O(1) and View() hands the overlay the filled part without copying.
+    Points are grouped into strokes. With separate=True a NaN row goes between strokes and
+    the overlay leaves that gap undrawn. Otherwise strokes simply follow each other, like
+    the point pairs Game4 draws with increment 2. UndoStroke drops the last stroke in O(1).
+    """
+    def __init__(self, capacity: int = 256, separate: bool = True):
+        self.data = np.empty((max(capacity, 1), 5), dtype=float)
+        self.separate = separate
+        self.size = 0
+        self.starts = []  # first row of every stroke
+
+    def __len__(self):
+        return self.size
+
+    def Strokes(self) -> int:
+        return len(self.starts)
+
+    def BeginStroke(self) -> None:
+        """
+        The next Append starts a new stroke, nothing happens if the current one is still empty
+        """
+        if self.starts and self.starts[-1] == self.size:
+            return
+        if self.separate and self.size:
+            self._Reserve(1)
+            self.data[self.size] = np.nan
+            self.size += 1
+        self.starts.append(self.size)
+
+    def Append(self, point, color) -> None:
+        """
+        :param point: (x, y)
+        :param color: (r, g, b)
+        """
+        if not self.starts:
+            self.starts.append(self.size)
+        self._Reserve(1)
+        row = self.data[self.size]
+        row[0], row[1] = point[0], point[1]
+        row[2:5] = np.ravel(color)[:3]
+        self.size += 1
+
+    def ReplaceLast(self, point) -> None:
+        """
+        Moves the last row, keeps its colour
+        """
+        row = self.data[self.size - 1]
+        row[0], row[1] = point[0], point[1]
+
+    def _Reserve(self, count: int) -> None:
+        if self.size + count > len(self.data):
+            grown = np.empty((max(2 * len(self.data), self.size + count), 5), dtype=float)
+            grown[:self.size] = self.data[:self.size]
+            self.data = grown
+
+    def UndoStroke(self) -> None:
+        if not self.starts:
+            return
+        start = self.starts.pop()
+        # Take the separator in front of it too
+        self.size = start - 1 if self.separate and start > 0 else start
+
+    def Clear(self) -> None:
+        self.size = 0
+        self.starts = []
+
+    def View(self) -> np.ndarray:
+        """
+        Rows written so far, a view into the buffer. It is only valid until the next
+        change, so assign a fresh one to CameraHandler.drawn_line after every change
+        (the assignment is also what marks the overlay for re-rendering).
+        """
+        return self.data[:self.size]
+
+    def LastPoint(self):
+        """
+        :return: (x, y) of the last row of the current stroke, None if it is empty
+        """
+        if not self.starts or self.starts[-1] == self.size:
+            return None
+        return self.data[self.size - 1, :2]
+
+    def StrokePoints(self, index: int = -1) -> np.ndarray:
+        """
+        View of one stroke's rows
+        """
+        index = index % len(self.starts)
+        if index + 1 < len(self.starts):
+            end = self.starts[index + 1] - (1 if self.separate else 0)
+        else:
+            end = self.size
+        return self.data[self.starts[index]:end]
+
+
+class StrokeSimplifier:
+    """
+    Online simplification of a sampled pen path. Samples closer than min_distance to the
+    previous one are dropped, then an opening window keeps extending the current segment
+    while every sample since the last vertex stays within tolerance of it (a one-pass
+    Ramer-Douglas-Peucker). Once a sample breaks that, the previous one becomes a vertex.
+    The window is capped so each sample costs at most O(window).
+    """
+    def __init__(self, min_distance: float = 2.0, tolerance: float = 1.5, window: int = 64):
+        self.min_distance = min_distance
+        self.tolerance = tolerance
+        self.window = window
+        self.anchor = None
+        self.pending = []
+        self.samples = 0
+        self.vertices = 0
+
+    def Begin(self, point) -> None:
+        self.anchor = np.asarray(point, dtype=float)[:2]
+        self.pending = []
+        # Counters are per stroke
+        self.samples = 1
+        self.vertices = 1
+
+    def Add(self, point):
+        """
+        :return: None if the sample was dropped, 'extend' if it only moves the end of the
+                 current segment, or the new vertex (x, y) that was fixed before it
+        """
+        point = np.asarray(point, dtype=float)[:2]
+        self.samples += 1
+        last = self.pending[-1] if self.pending else self.anchor
+        if np.hypot(*(point - last)) < self.min_distance:
+            return None
+
+        self.pending.append(point)
+        if len(self.pending) <= self.window and self._Fits():
+            return 'extend'
+
+        vertex = self.pending[-2]
+        self.anchor = vertex
+        self.pending = [point]
+        self.vertices += 1
+        return vertex
+
+    def _Fits(self) -> bool:
+        # Distance of every in-between sample from the anchor -> newest segment
+        if len(self.pending) < 2:
+            return True
+        end = self.pending[-1]
+        direction = end - self.anchor
+        length = np.hypot(*direction)
+        between = np.array(self.pending[:-1]) - self.anchor
+        if length == 0:
+            distance = np.hypot(between[:, 0], between[:, 1])
+        else:
+            distance = np.abs(between[:, 0] * direction[1] - between[:, 1] * direction[0]) / length
+        return bool(np.all(distance <= self.tolerance))
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Appending one point at a time: np.vstack like Game3 used to against the stroke buffer
+    import timeit
+
+    color = np.array([[255, 0, 0]])
+    rng = np.random.default_rng(0)
+
+    def Vstack(n):
+        points = np.array([])
+        for _ in range(n):
+            row = np.hstack((rng.uniform(0, 640, (1, 2)), color))
+            points = np.vstack((points, row)) if points.shape[0] >= 1 else row
+        return points
+
+    def Buffer(n):
+        strokes = StrokeBuffer()
+        for _ in range(n):
+            strokes.Append(rng.uniform(0, 640, 2), color)
+            strokes.View()
+        return strokes
+
+    for n in (1000, 10000, 50000):
+        t_vstack = min(timeit.repeat(lambda: Vstack(n), number=1, repeat=3))
+        t_buffer = min(timeit.repeat(lambda: Buffer(n), number=1, repeat=3))
+        print(f'{n:>6} points: vstack {t_vstack * 1e3:8.1f} ms ({t_vstack / n * 1e6:6.1f} us/point), '
+              f'buffer {t_buffer * 1e3:6.1f} ms ({t_buffer / n * 1e6:4.1f} us/point)')
+
+    # Strokes, separators and undo
+    strokes = StrokeBuffer(capacity=2)
+    for k in range(3):
+        strokes.BeginStroke()
+        for i in range(4):
+            strokes.Append((k, i), (k, 0, 0))
+    assert len(strokes) == 3 * 4 + 2 and strokes.Strokes() == 3
+    assert np.isnan(strokes.View()[4]).all() and np.isnan(strokes.View()[9]).all()
+    assert np.array_equal(strokes.StrokePoints(1)[:, 1], np.arange(4)) and np.all(strokes.StrokePoints(1)[:, 0] == 1)
+    assert np.shares_memory(strokes.View(), strokes.data)
+    strokes.UndoStroke()
+    assert len(strokes) == 9 and not np.isnan(strokes.View()[-1]).any()
+    strokes.UndoStroke(), strokes.UndoStroke(), strokes.UndoStroke()
+    assert len(strokes) == 0 and strokes.Strokes() == 0
+
+    pairs = StrokeBuffer(separate=False)
+    for k in range(3):
+        pairs.BeginStroke()
+        pairs.Append((k, 0), (0, 255, 0))
+        pairs.Append((k, 1), (0, 255, 0))
+    pairs.UndoStroke()
+    assert len(pairs) == 4 and np.array_equal(pairs.StrokePoints()[:, 0], [1, 1])
+    print('strokes, separators and undo ok')
+
+    # A 10 s pen stroke sampled at 60 fps with 0.5 px tracking noise, simplified online
+    t = np.arange(0, 10, 1 / 60)
+    path = np.column_stack((320 + 120 * np.cos(t * 0.8) + 30 * t, 320 + 80 * np.sin(t * 1.7)))
+    samples = path + rng.normal(0, 0.5, path.shape)
+
+    for tolerance in (1.0, 1.5, 3.0):
+        simplifier = StrokeSimplifier(tolerance=tolerance)
+        stroke = StrokeBuffer()
+        simplifier.Begin(samples[0])
+        stroke.Append(samples[0], color)
+        stroke.Append(samples[0], color)
+
+        def Feed():
+            for sample in samples[1:]:
+                result = simplifier.Add(sample)
+                if result is None:
+                    continue
+                if isinstance(result, str):
+                    stroke.ReplaceLast(sample)
+                else:
+                    stroke.ReplaceLast(result)
+                    stroke.Append(sample, color)
+
+        t_feed = timeit.timeit(Feed, number=1)
+        vertices = stroke.View()[:, :2]
+
+        # Worst distance from a sample to the simplified polyline
+        a, b = vertices[:-1], vertices[1:]
+        ab = b - a
+        along = np.clip(np.einsum('ijk,jk->ij', samples[:, None] - a, ab) / np.maximum(np.sum(ab ** 2, axis=1), 1e-12), 0, 1)
+        nearest = a + along[..., None] * ab
+        error = np.min(np.linalg.norm(samples[:, None] - nearest, axis=2), axis=1)
+
+        print(f'tolerance {tolerance} px: {len(samples)} samples -> {len(vertices)} vertices, '
+              f'max deviation {error.max():.2f} px, {t_feed / len(samples) * 1e6:.1f} us/sample')
+        assert error.max() <= tolerance + simplifier.min_distance
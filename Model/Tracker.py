@@ -0,0 +1,243 @@
+import cv2
+import numpy as np
+
+import threading
+import time
+
+
+def DetectRobot(frame: np.ndarray, threshold: int = 87):
+    """
+    Same detection as ImageProcessing.GetPos on an RGB frame or window of one
+    :param frame:
+    :param threshold:
+    :return: (cx, cy, area) in frame pixels, or None
+    """
+    Image = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY)
+    ret, BinaryImage = cv2.threshold(Image, threshold, 255, cv2.THRESH_BINARY_INV)
+    kernel = np.ones((5, 5), np.uint8)
+    dilate = cv2.dilate(BinaryImage, kernel, iterations=1)
+    contours, _ = cv2.findContours(dilate, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if contours:
+        contour = max(contours, key=cv2.contourArea)
+        M = cv2.moments(contour)
+        if M["m00"] != 0:
+            return M["m10"] / M["m00"], M["m01"] / M["m00"], M["m00"]
+    return None
+
+
+class RobotTracker:
+    """
+    Tracks the robot with a constant-velocity Kalman filter and only searches a
+    window around the predicted position. Falls back to the full frame when the
+    track is lost.
+    """
+    def __init__(self, window: int = 60, max_misses: int = 3, process_noise: float = 500.0,
+                 measurement_noise: float = 2.0):
+        self.window = window  # half size of the search window in pixels
+        self.max_misses = max_misses
+        self.q = process_noise  # acceleration noise, px/s^2
+        self.r = measurement_noise  # centroid noise, px
+
+        self.x = None  # state [x, y, vx, vy]
+        self.P = None
+        self.area = None  # running blob area, used for the confidence score
+        self.misses = 0
+        self.last_time = None
+
+        self.confidence = 0.0
+        self.full_searches = 0
+
+    def Reset(self):
+        self.x = None
+        self.P = None
+        self.area = None
+        self.misses = 0
+        self.last_time = None
+        self.confidence = 0.0
+
+    def Predict(self, dt: float) -> None:
+        F = np.eye(4)
+        F[0, 2] = F[1, 3] = dt
+        G = np.array([[dt ** 2 / 2, 0], [0, dt ** 2 / 2], [dt, 0], [0, dt]])
+        self.x = F.dot(self.x)
+        self.P = F.dot(self.P).dot(F.T) + G.dot(G.T) * self.q ** 2
+
+    def Correct(self, z: np.ndarray) -> float:
+        """
+        :return: normalized innovation distance of the measurement
+        """
+        H = np.eye(2, 4)
+        S = H.dot(self.P).dot(H.T) + np.eye(2) * self.r ** 2
+        innovation = z - H.dot(self.x)
+        K = self.P.dot(H.T).dot(np.linalg.inv(S))
+        self.x = self.x + K.dot(innovation)
+        self.P = (np.eye(4) - K.dot(H)).dot(self.P)
+        return float(np.sqrt(innovation.dot(np.linalg.inv(S)).dot(innovation)))
+
+    def Track(self, frame: np.ndarray, timestamp: float = None):
+        """
+        Entry point, call once per frame
+        :param frame: processed RGB frame
+        :param timestamp: capture time in seconds, defaults to now
+        :return: (np.array([cx, cy]) or None, confidence in [0, 1])
+        """
+        if frame is None:
+            return None, 0.0
+
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        dt = timestamp - self.last_time if self.last_time is not None else 0.0
+        self.last_time = timestamp
+
+        detection = None
+        distance = 0.0
+        if self.x is not None and self.misses <= self.max_misses:
+            self.Predict(dt)
+            detection = self.SearchWindow(frame)
+
+        if detection is None:
+            # Lost (or never had) the track, search everything
+            self.full_searches += 1
+            detection = DetectRobot(frame)
+            if detection is None:
+                self.misses += 1
+                self.confidence = 0.0
+                if self.misses > self.max_misses:
+                    self.x = None
+                return None, 0.0
+
+            cx, cy, area = detection
+            if self.x is None:
+                self.x = np.array([cx, cy, 0.0, 0.0])
+                self.P = np.diag([self.r ** 2, self.r ** 2, 100.0 ** 2, 100.0 ** 2])
+            else:
+                distance = self.Correct(np.array([cx, cy]))
+
+        else:
+            cx, cy, area = detection
+            distance = self.Correct(np.array([cx, cy]))
+
+        self.misses = 0
+        self.area = area if self.area is None else 0.9 * self.area + 0.1 * area
+
+        # High when the blob looks like the one we have been following and sits where it was expected
+        shape_score = min(area, self.area) / max(area, self.area)
+        motion_score = np.exp(-0.5 * (distance / 3.0) ** 2)
+        self.confidence = float(shape_score * motion_score)
+
+        return np.array([int(cx), int(cy)]), self.confidence
+
+    def SearchWindow(self, frame: np.ndarray):
+        h, w = frame.shape[:2]
+        # Grow the window with the position uncertainty
+        half = int(self.window + 3 * np.sqrt(max(self.P[0, 0], self.P[1, 1])))
+        px, py = int(self.x[0]), int(self.x[1])
+        left, top = max(px - half, 0), max(py - half, 0)
+        right, bottom = min(px + half, w), min(py + half, h)
+        if right - left < 2 or bottom - top < 2:
+            return None
+
+        detection = DetectRobot(frame[top:bottom, left:right])
+        if detection is None:
+            return None
+        cx, cy, area = detection
+        return cx + left, cy + top, area
+
+
+class PositionBuffer:
+    """
+    Ring buffer of the latest tracked positions, written by the camera thread
+    and read by the games. Rows are [timestamp, x, y, frame_id, confidence].
+    """
+    def __init__(self, size: int = 256):
+        self.lock = threading.Lock()
+        self.data = np.zeros((size, 5))
+        self.count = 0
+
+    def Append(self, timestamp: float, pos: np.ndarray, frame_id: int, confidence: float) -> None:
+        with self.lock:
+            self.data[self.count % len(self.data)] = (timestamp, pos[0], pos[1], frame_id, confidence)
+            self.count += 1
+
+    def Latest(self, max_age: float = None):
+        """
+        :param max_age: seconds, older positions count as lost
+        :return: [timestamp, x, y, frame_id, confidence] or None
+        """
+        with self.lock:
+            if self.count == 0:
+                return None
+            row = self.data[(self.count - 1) % len(self.data)].copy()
+        if max_age is not None and time.monotonic() - row[0] > max_age:
+            return None
+        return row
+
+    def Recent(self, n: int) -> np.ndarray:
+        """
+        :return: up to n rows, oldest first
+        """
+        with self.lock:
+            n = min(n, self.count, len(self.data))
+            idx = np.arange(self.count - n, self.count) % len(self.data)
+            return self.data[idx].copy()
+
+    def Clear(self) -> None:
+        with self.lock:
+            self.count = 0
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # python -m Model.Tracker [folder of recorded RGB png frames]
+    import glob
+    import os
+    import sys
+    import timeit
+
+    from Model.Camera import ImageProcessing
+
+    processing = ImageProcessing()
+
+    if len(sys.argv) > 1:
+        paths = sorted(glob.glob(os.path.join(sys.argv[1], '*.png')))
+        frames = [cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB) for path in paths]
+        frames = [frame if frame.shape[:2] == (700, 700) else processing.CropImage(frame) for frame in frames]
+    else:
+        # Synthetic recording: the robot circles the workspace centre
+        from Model.Simulator import SyntheticCamera, CoilSimulator
+
+        camera = SyntheticCamera(simulator=CoilSimulator())
+        frames = []
+        for t in np.linspace(0, 2 * np.pi, 300):
+            pos = np.array([350 + 120 * np.cos(t), 350 + 120 * np.sin(t)])
+            frames.append(processing.OutputProcessedCameraFrame(camera.Render(pos)))
+
+    timestamps = np.arange(len(frames)) / 30.0
+
+    reference = [processing.GetPos(frame) for frame in frames]
+    tracker = RobotTracker()
+    tracked = [tracker.Track(frame, t) for frame, t in zip(frames, timestamps)]
+    full_searches = tracker.full_searches
+
+    errors = [np.linalg.norm(ref - pos) for ref, (pos, _) in zip(reference, tracked) if ref is not None and pos is not None]
+    confidences = [confidence for _, confidence in tracked]
+
+    def RunGetPos():
+        for frame in frames:
+            processing.GetPos(frame)
+
+    def RunTracker():
+        tracker.Reset()
+        for frame, t in zip(frames, timestamps):
+            tracker.Track(frame, t)
+
+    t_full = min(timeit.repeat(RunGetPos, number=1, repeat=3)) / len(frames)
+    t_track = min(timeit.repeat(RunTracker, number=1, repeat=3)) / len(frames)
+
+    print(f'{len(frames)} frames, max deviation from GetPos: {max(errors):.1f} px, '
+          f'mean confidence {np.mean(confidences):.2f}, full-frame searches {full_searches}')
+    print(f'GetPos: {t_full * 1e3:.2f} ms per call')
+    print(f'RobotTracker: {t_track * 1e3:.2f} ms per call ({t_full / t_track:.1f}x)')
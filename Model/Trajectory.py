@@ -0,0 +1,206 @@
+import numpy as np
+
+import threading
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from Model.Scheduler import GetScheduler
+
+
+def BuildWaveform(rows: np.ndarray, solver, rate: float = 100.0, slew: float = 20.0):
+    """
+    Samples a command table into a current waveform in one vectorized pass.
+    Every row is held for its duration. At the start of a row the currents blend from the
+    previous row's with a smoothstep, as short as the coil slew rate allows. The field and
+    force are linear in the currents, so B and its direction sweep smoothly from one row to
+    the next and every sample stays within the limits of both ends.
+    :param rows: (n, 4) [B (mT), G (mT/m), theta (deg), duration (s)] like the CommandsBox
+    :param solver: EduMag
+    :param rate: samples per second
+    :param slew: A/s the driver follows
+    :return: (currents (N, 4), row index (N,))
+    """
+    rows = np.asarray(rows, dtype=float).reshape(-1, 4)
+    B, G, theta, durations = rows.T
+    row_currents = solver.SetFieldForceBatch(B, G, theta)
+
+    starts = np.concatenate(([0.0], np.cumsum(durations)))
+    t = np.arange(int(round(starts[-1] * rate))) / rate
+    row = np.clip(np.searchsorted(starts, t, side='right') - 1, 0, len(rows) - 1)
+    local = t - starts[row]
+
+    # The first row blends up from coils off
+    previous = np.vstack((np.zeros(4), row_currents[:-1]))
+    step = np.max(np.abs(row_currents - previous), axis=1)
+    blend = np.minimum(1.5 * step / slew, 0.5 * durations)  # smoothstep peaks at 1.5x the mean slope
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.where(blend[row] > 0, np.clip(local / blend[row], 0, 1), 1.0)
+    s = (x * x * (3 - 2 * x))[:, np.newaxis]
+
+    return previous[row] + s * (row_currents[row] - previous[row]), row
+
+
+class TrajectoryPlayer(QObject):
+    """
+    Streams a precomputed waveform to the coils as a scheduler stage. The sample is
+    picked from the elapsed time, so a late tick skips samples instead of stretching
+    the sequence. Pause resets the coils and remembers the exact sample, Resume carries
+    on from it.
+    """
+    row_changed = pyqtSignal(int)
+    finished = pyqtSignal()
+
+    def __init__(self, edumag, rate: float = 100.0, slew: float = 20.0, name: str = 'trajectory'):
+        """
+        :param edumag: EduMagHandler, samples go out through SendCurrents
+        """
+        super().__init__()
+        self.edumag = edumag
+        self.rate = rate
+        self.slew = slew
+        self.name = name
+        self.scheduler = GetScheduler()
+
+        self.lock = threading.Lock()
+        self.stage = None
+        self.currents = np.zeros((0, 4))
+        self.rows = np.zeros(0, dtype=int)
+        self.index = 0  # next sample
+        self.start_time = None
+        self.row = -1
+
+    def Load(self, rows: np.ndarray) -> None:
+        self.Stop()
+        self.currents, self.rows = BuildWaveform(rows, self.edumag.Edumag, self.rate, self.slew)
+        self.index = 0
+        self.row = -1
+
+    def Start(self) -> None:
+        self.Resume()
+
+    def Pause(self) -> None:
+        with self.lock:
+            if self.stage is None:
+                return
+            self.scheduler.RemoveStage(self.stage)
+            self.stage = None
+        self.edumag.ResetCurrents()
+
+    def Resume(self) -> None:
+        with self.lock:
+            if self.stage is not None or self.index >= len(self.currents):
+                return
+            self.start_time = time.monotonic() - self.index / self.rate
+            self.stage = self.scheduler.AddStage(self.name, self.Tick, self.rate)
+
+    def Stop(self) -> None:
+        self.Pause()
+        self.index = len(self.currents)
+
+    def IsRunning(self) -> bool:
+        return self.stage is not None
+
+    def Tick(self):
+        with self.lock:
+            if self.stage is None:
+                return
+            index = int((time.monotonic() - self.start_time) * self.rate)
+            if index >= len(self.currents):
+                self.scheduler.RemoveStage(self.stage)
+                self.stage = None
+                self.index = len(self.currents)
+                done = True
+            else:
+                self.index = index + 1
+                done = False
+                # Still under the lock, so a Pause/Stop can't reset the coils between the check and the send
+                self.edumag.SendCurrents(self.currents[index])
+
+        if done:
+            self.edumag.ResetCurrents()
+            self.finished.emit()
+            return
+
+        if self.rows[index] != self.row:
+            self.row = self.rows[index]
+            self.row_changed.emit(int(self.row))
+
+
+"""
+
+BENCHMARK
+
+"""
+if __name__ == '__main__':
+    # Waveform build time against a per-sample loop, slew check, and pause/resume accuracy on the scheduler
+    from PyQt5.QtCore import QCoreApplication, QTimer
+    import sys
+    import timeit
+
+    from Model.EduMag import EduMag
+
+    app = QCoreApplication(sys.argv)
+    solver = EduMag()
+    rate, slew = 100.0, 20.0
+
+    rng = np.random.default_rng(0)
+    n = 40
+    rows = np.column_stack((rng.uniform(5, 15, n), rng.uniform(50, 250, n), rng.integers(0, 360, n),
+                            rng.choice([0.05, 0.1, 0.25, 0.5, 1.0, 2.0], n)))
+
+    currents, row = BuildWaveform(rows, solver, rate, slew)
+
+    def PerSample():
+        # Same waveform without the blends, one SetFieldForce per sample
+        starts = np.concatenate(([0.0], np.cumsum(rows[:, 3])))
+        out = []
+        for k in range(len(currents)):
+            r = min(np.searchsorted(starts, k / rate, side='right') - 1, n - 1)
+            out.append(solver.SetFieldForce(rows[r, 0], rows[r, 1], rows[r, 2]))
+        return np.array(out)
+
+    t_vector = min(timeit.repeat(lambda: BuildWaveform(rows, solver, rate, slew), number=1, repeat=5))
+    t_loop = min(timeit.repeat(PerSample, number=1, repeat=3))
+    print(f'{n} rows, {len(currents)} samples: BuildWaveform {t_vector * 1e3:.2f} ms, '
+          f'per-sample loop without blends {t_loop * 1e3:.1f} ms')
+    assert np.all(np.abs(currents) < 4)
+
+    # Rows long enough for a full blend follow the slew limit
+    slow = BuildWaveform(np.column_stack((rows[:, :3], np.full(n, 2.0))), solver, rate, slew)[0]
+    print(f'max current slope with 2 s rows: {np.max(np.abs(np.diff(slow, axis=0))) * rate:.1f} A/s '
+          f'(slew limit {slew} A/s)')
+
+    class Sink:
+        # The parts of EduMagHandler the player talks to, logs which sample went out
+        Edumag = solver
+
+        def __init__(self):
+            self.sent = []
+
+        def SendCurrents(self, I):
+            self.sent.append(player.index - 1)
+
+        def ResetCurrents(self):
+            self.sent.append(None)
+
+    sink = Sink()
+    player = TrajectoryPlayer(sink, rate, slew)
+    player.Load(rows[:6])
+
+    player.finished.connect(app.quit)
+    player.Start()
+    QTimer.singleShot(700, player.Pause)
+    QTimer.singleShot(1500, player.Resume)
+    QTimer.singleShot(30000, app.quit)
+    app.exec_()
+    player.scheduler.stop()
+
+    pause = sink.sent.index(None)
+    before = sink.sent[:pause]
+    after = [index for index in sink.sent[pause + 1:] if index is not None]
+    sent = before + after
+    print(f'{len(player.currents)} samples, paused after sample {before[-1]}, resumed at sample {after[0]}, '
+          f'{len(player.currents) - len(set(sent))} skipped by late ticks, {len(sent) - len(set(sent))} repeated')
+    assert after[0] == before[-1] + 1